@@ -0,0 +1,262 @@
+# Runs dupfinder.find_duplicates over a generated tree and reports each stage's cost
+# Usage: python bench_dupfinder.py --files 20000 --dup-ratio 0.2 --same-size-ratio 0.1 --scale 1,2,4
+
+import argparse
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import dupfinder as d
+
+STAGES = ('scan', 'partial', 'full', 'verify')
+
+
+def file_sizes(rng, count, distribution, mean, sizes_used):
+    # sizes are kept distinct unless a file is meant to share one, so the
+    # ratios below are the only source of same-size groups
+    for _ in range(count):
+        while True:
+            if distribution == 'fixed':
+                size = mean
+            elif distribution == 'uniform':
+                size = rng.randint(1, 2 * mean)
+            else:
+                size = max(1, int(rng.lognormvariate(0, 1.5) * mean / 3))
+            if distribution == 'fixed' or size not in sizes_used:
+                break
+            mean += 1  # a dense distribution runs out of distinct sizes otherwise
+        sizes_used.add(size)
+        yield size
+
+
+def make_tree(root, files, distribution='lognormal', mean_size=64 * 1024, dup_ratio=0.1,
+              same_size_ratio=0.1, hardlink_ratio=0.05, per_dir=100, seed=0):
+    """Write files under root and return how many of each kind there are.
+
+    Each file is, in turn with the given ratios, a hard link to an earlier
+    file, a copy of one, a file of the same size as one that differs in a
+    single byte in the middle (so that only the full hash tells them apart),
+    or a file of a new size with random contents. Directories hold per_dir
+    files and are nested two levels deep.
+    """
+    rng = random.Random(seed)
+    sizes = file_sizes(rng, files, distribution, mean_size, set())
+    originals = []
+    kinds = dict(unique=0, duplicate=0, same_size=0, hardlink=0)
+
+    for number in range(files):
+        directory = os.path.join(root, 'd%03d' % (number // (per_dir * per_dir)),
+                                 'd%03d' % (number // per_dir % per_dir))
+        if number % per_dir == 0:
+            os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, 'f%07d' % number)
+
+        roll = rng.random()
+        if originals and roll < hardlink_ratio:
+            os.link(rng.choice(originals)[0], path)
+            kinds['hardlink'] += 1
+            continue
+
+        if originals and roll < hardlink_ratio + dup_ratio:
+            data = rng.choice(originals)[1]
+            kinds['duplicate'] += 1
+        elif originals and roll < hardlink_ratio + dup_ratio + same_size_ratio:
+            data = bytearray(rng.choice(originals)[1])
+            data[len(data) // 2] ^= 0xff
+            data = bytes(data)
+            kinds['same_size'] += 1
+        else:
+            data = rng.randbytes(next(sizes))
+            kinds['unique'] += 1
+
+        with open(path, 'wb') as file_p:
+            file_p.write(data)
+        # only a sample of the contents is kept around to copy from
+        if len(originals) < 1000:
+            originals.append((path, data))
+        elif rng.random() < 0.01:
+            originals[rng.randrange(len(originals))] = (path, data)
+
+    return kinds
+
+
+def read_io():
+    # logical bytes read and read-like syscalls of this process, all threads included
+    counters = {}
+    with open('/proc/self/io') as io:
+        for line in io:
+            name, value = line.split(':')
+            counters[name] = int(value)
+    return counters['rchar'], counters['syscr']
+
+
+class CountingEntry(object):
+    """A DirEntry that counts its stat() calls."""
+
+    def __init__(self, entry, meter):
+        self.entry = entry
+        self.meter = meter
+
+    def __getattr__(self, name):
+        return getattr(self.entry, name)
+
+    def stat(self, **kwargs):
+        self.meter.stats += 1
+        return self.entry.stat(**kwargs)
+
+
+class CountingScandir(object):
+    def __init__(self, iterator, meter):
+        self.iterator = iterator
+        self.meter = meter
+
+    def __iter__(self):
+        for entry in self.iterator:
+            yield CountingEntry(entry, self.meter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.iterator.close()
+
+
+class Meter(object):
+    """Per-stage wall time, reads, stat calls, page faults and peak memory.
+
+    stat calls are counted by wrapping os.stat, os.lstat, os.fstat and the
+    entries of os.scandir for the duration of the run. Bytes read through
+    mmap (the verify stage) do not show up as reads but as page faults.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.results = {}
+        self.stage = None
+        self.stats = 0
+        self.patched = {}
+
+    def start(self):
+        for name in ('stat', 'lstat', 'fstat'):
+            self.patched[name] = getattr(os, name)
+            setattr(os, name, self.counting(self.patched[name]))
+        self.patched['scandir'] = os.scandir
+        os.scandir = lambda path: CountingScandir(self.patched['scandir'](path), self)
+        if self.trace_memory:
+            tracemalloc.start()
+
+    def counting(self, func):
+        def counted(*args, **kwargs):
+            self.stats += 1
+            return func(*args, **kwargs)
+        return counted
+
+    def snapshot(self):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return (time.perf_counter(),) + read_io() + (self.stats, usage.ru_minflt + usage.ru_majflt)
+
+    def enter(self, stage):
+        if self.stage is not None:
+            self.leave()
+        self.stage = stage
+        self.started = self.snapshot()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+
+    def leave(self):
+        ended = self.snapshot()
+        seconds, read, reads, stats, faults = [b - a for a, b in zip(self.started, ended)]
+        peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else 0
+        self.results[self.stage] = dict(seconds=seconds, read=read, reads=reads, stats=stats,
+                                        faults=faults, peak=peak)
+        self.stage = None
+
+    def stop(self):
+        if self.stage is not None:
+            self.leave()
+        if self.trace_memory:
+            tracemalloc.stop()
+        for name, func in self.patched.items():
+            setattr(os, name, func)
+
+
+def run(root, files, args):
+    meter = Meter(not args.no_trace_memory)
+    meter.start()
+    try:
+        groups = d.find_duplicates(root, args.algorithm, workers=args.workers,
+                                   verify=args.verify, on_stage=meter.enter)
+    finally:
+        meter.stop()
+
+    print("%d files, %d duplicate groups holding %d files" % (
+        files, len(groups), sum(len(group) for group in groups)))
+    print("%-8s %9s %10s %10s %10s %10s %10s %10s" % (
+        "stage", "seconds", "us/file", "MiB read", "reads", "stats", "faults", "peak MiB"))
+    for stage in STAGES:
+        if stage not in meter.results:
+            continue
+        result = meter.results[stage]
+        print("%-8s %9.3f %10.1f %10.1f %10d %10d %10d %10.1f" % (
+            stage, result['seconds'], result['seconds'] * 1e6 / files, result['read'] / 1048576.0,
+            result['reads'], result['stats'], result['faults'], result['peak'] / 1048576.0))
+    return meter.results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dupfinder.py on a generated file tree.")
+    parser.add_argument("--files", type=int, default=10000, help="files in the tree at scale 1")
+    parser.add_argument("--size-dist", choices=('lognormal', 'uniform', 'fixed'), default='lognormal',
+                        help="distribution of file sizes (default: lognormal)")
+    parser.add_argument("--mean-size", type=int, default=64 * 1024, help="typical file size in bytes")
+    parser.add_argument("--dup-ratio", type=float, default=0.1, help="share of files that are copies")
+    parser.add_argument("--same-size-ratio", type=float, default=0.1,
+                        help="share of files with the size but not the contents of another")
+    parser.add_argument("--hardlink-ratio", type=float, default=0.05,
+                        help="share of files that are hard links to another")
+    parser.add_argument("--scale", default="1",
+                        help="comma separated multiples of --files to run, e.g. 1,2,4 to check scaling")
+    parser.add_argument("--algorithm", default="md5")
+    parser.add_argument("-w", "--workers", type=int, default=1)
+    parser.add_argument("--verify", action="store_true", help="include the byte-for-byte stage")
+    parser.add_argument("--no-trace-memory", action="store_true",
+                        help="skip tracemalloc, which slows down the scan, and only report timings")
+    parser.add_argument("--dir", help="generate the trees here and keep them (default: a temporary directory)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    base = args.dir or tempfile.mkdtemp(prefix='bench_dupfinder')
+    scaling = []
+    try:
+        for scale in [int(value) for value in args.scale.split(',')]:
+            files = args.files * scale
+            root = os.path.join(base, 'tree-%d' % files)
+            if not os.path.isdir(root):
+                start = time.time()
+                kinds = make_tree(root, files, args.size_dist, args.mean_size, args.dup_ratio,
+                                  args.same_size_ratio, args.hardlink_ratio, seed=args.seed)
+                print("generated %s in %.1f s: %s" % (root, time.time() - start, ", ".join(
+                    "%d %s" % (count, kind) for kind, count in sorted(kinds.items()))))
+            # the tree was just written, so its pages are cached; drop the
+            # page cache by hand (as root) for cold-cache numbers
+            results = run(root, files, args)
+            scaling.append((files, sum(result['seconds'] for result in results.values())))
+            print("")
+    finally:
+        if not args.dir:
+            shutil.rmtree(base)
+
+    if len(scaling) > 1:
+        files, seconds = scaling[0]
+        print("scaling (time relative to %d files, linear = file ratio):" % files)
+        for count, total in scaling:
+            print("  %8d files: %.2f s, x%.2f for x%.2f files" % (
+                count, total, total / seconds, count / float(files)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# Unattended clean-up of duplicate groups: pick a file to keep by policy,
+# then delete, hard link or symlink the others, and report what was done
+
+import csv
+import json
+import os
+
+KEEP_POLICIES = ('oldest', 'newest', 'shortest')
+ACTIONS = ('delete', 'hardlink', 'symlink')
+
+
+def keeper(group, policy):
+    """The file of group to keep under policy."""
+    if policy == 'shortest':
+        return min(group, key=lambda path: (len(path), path))
+    mtimes = dict((path, os.stat(path).st_mtime) for path in group)
+    if policy == 'newest':
+        return max(group, key=lambda path: (mtimes[path], path))
+    return min(group, key=lambda path: (mtimes[path], path))
+
+
+def plan(groups, policy='oldest'):
+    """One entry per group: the file kept, the ones to act on and their size."""
+    entries = []
+    for group in groups:
+        try:
+            keep = keeper(group, policy)
+            size = os.stat(keep).st_size
+        except OSError:
+            continue
+        entries.append({
+            'keep': keep,
+            'duplicates': [path for path in group if path != keep],
+            'size': size,
+        })
+    return entries
+
+
+def replace_with_link(path, target, symbolic):
+    # the link is made next to path and renamed over it, so path is never missing
+    temp = path + '.dedupe-tmp'
+    if symbolic:
+        os.symlink(os.path.abspath(target), temp)
+    else:
+        os.link(target, temp)
+    try:
+        os.replace(temp, path)
+    except OSError:
+        os.remove(temp)
+        raise
+
+
+def apply(entries, action='delete', dry_run=False):
+    """Apply action to every duplicate of entries, recording the outcome.
+
+    Each entry gets a 'results' list of {path, status} and the bytes it
+    reclaimed (or would, with dry_run). Failures are recorded, not raised.
+    """
+    for entry in entries:
+        entry['action'] = action
+        entry['results'] = []
+        entry['reclaimed'] = 0
+        for path in entry['duplicates']:
+            status = 'dry-run'
+            if not dry_run:
+                try:
+                    if action == 'delete':
+                        os.remove(path)
+                    else:
+                        replace_with_link(path, entry['keep'], action == 'symlink')
+                    status = 'done'
+                except OSError as e:
+                    status = 'error: ' + (e.strerror or str(e))
+            if not status.startswith('error'):
+                entry['reclaimed'] += entry['size']
+            entry['results'].append({'path': path, 'status': status})
+    return entries
+
+
+def write_report(entries, path):
+    """Write entries as JSON, or as CSV with one row per file if path ends in .csv."""
+    reclaimed = sum(entry.get('reclaimed', 0) for entry in entries)
+
+    if not path.endswith('.csv'):
+        with open(path, 'w') as report:
+            json.dump({'groups': entries, 'reclaimed_bytes': reclaimed}, report, indent=1)
+        return
+
+    with open(path, 'w', newline='') as report:
+        writer = csv.writer(report)
+        writer.writerow(['group', 'path', 'size', 'role', 'action', 'status'])
+        for number, entry in enumerate(entries, 1):
+            writer.writerow([number, entry['keep'], entry['size'], 'keep', '', ''])
+            for result in entry.get('results', []):
+                writer.writerow([number, result['path'], entry['size'], 'duplicate',
+                                 entry.get('action', ''), result['status']])
+
+
+def add_batch_arguments(parser):
+    """Add the non-interactive mode's options to an argparse parser."""
+    parser.add_argument("--batch", action="store_true",
+                        help="do not ask about each group, apply --action to all of them")
+    parser.add_argument("--keep", choices=KEEP_POLICIES, default='oldest',
+                        help="file of each group to keep in --batch mode (default: oldest)")
+    parser.add_argument("--action", choices=ACTIONS, default='delete',
+                        help="what to do with the other files (default: delete)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only report what --batch would do, never delete or ask")
+    parser.add_argument("--report", metavar="FILE",
+                        help="write the groups and reclaimed bytes to FILE (.json or .csv)")
+
+
+def run_batch(groups, args):
+    """Plan, apply and report according to add_batch_arguments' options."""
+    entries = apply(plan(groups, args.keep), args.action, args.dry_run)
+    if args.report:
+        write_report(entries, args.report)
+
+    reclaimed = sum(entry['reclaimed'] for entry in entries)
+    files = sum(len(entry['duplicates']) for entry in entries)
+    print("%d groups, %d duplicate files, %d bytes %s" % (
+        len(entries), files, reclaimed, "reclaimable" if args.dry_run else "reclaimed"))
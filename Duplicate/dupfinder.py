@@ -0,0 +1,398 @@
+# Shared engine of the duplicate finders
+# Streams the directory tree, groups files by size in a single pass and
+# hashes only the files that still look alike
+
+import collections
+import concurrent.futures
+import fnmatch
+import hashlib
+import mmap
+import os
+
+EDGE_SIZE = 4 * 1024  # bytes hashed from each end of a file by partial_hash
+CHUNK_SIZE = 1024 * 1024  # bytes read at a time by full_hash
+STRIDE = 8 * 1024 * 1024  # bytes of each file compared at a time by same_bytes
+MAX_OPEN = 16  # files compared at once by confirm
+
+
+def matches(patterns, name, relative):
+    # a pattern with a slash is matched against the path below the root,
+    # any other against the file or directory name alone
+    for pattern in patterns:
+        if fnmatch.fnmatch(relative if '/' in pattern else name, pattern):
+            return True
+    return False
+
+
+def scan(root, exclude=(), include=(), min_size=0, max_size=None, one_filesystem=False,
+         on_directory=None, top=None, all_links=False):
+    """Yield (path, size) for every regular file under root.
+
+    Directories are read with os.scandir one at a time, so the tree is never
+    held in memory, and symlinks are not followed. Everything is filtered
+    during the walk: excluded directories are never entered, a file must
+    match include (when given) and not exclude, both lists of glob patterns,
+    and lie within min_size and max_size bytes. A file with several hard links
+    is only yielded for the first one (for every one with all_links), and
+    with one_filesystem directories on other devices than root are skipped.
+    on_directory, if given, is called with each directory before it is read.
+    When root lies inside a larger tree, top is that tree's root: patterns
+    with a slash are then matched against paths below top, and
+    one_filesystem keeps to top's device.
+    """
+    top = root if top is None else top
+    root_dev = os.stat(top).st_dev
+    linked = set()
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            if on_directory is not None:
+                on_directory(directory)
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                relative = os.path.relpath(entry.path, top) if exclude or include else entry.name
+                if exclude and matches(exclude, entry.name, relative):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if one_filesystem and entry.stat(follow_symlinks=False).st_dev != root_dev:
+                            continue
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        if include and not matches(include, entry.name, relative):
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                        if st.st_size < min_size or (max_size is not None and st.st_size > max_size):
+                            continue
+                        if st.st_nlink > 1 and not all_links:
+                            if (st.st_dev, st.st_ino) in linked:
+                                continue
+                            linked.add((st.st_dev, st.st_ino))
+                        yield entry.path, st.st_size
+                except OSError:
+                    continue
+
+
+def add_scan_arguments(parser):
+    """Add the scan() filters as options of an argparse parser."""
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="skip files and directories matching GLOB (repeatable)")
+    parser.add_argument("--include", action="append", default=[], metavar="GLOB",
+                        help="only look at files matching GLOB (repeatable)")
+    parser.add_argument("--min-size", type=int, default=0,
+                        help="skip files smaller than this many bytes")
+    parser.add_argument("--max-size", type=int,
+                        help="skip files larger than this many bytes")
+    parser.add_argument("--one-file-system", action="store_true",
+                        help="do not descend into other file systems")
+
+
+def scan_filters(args):
+    """The scan() keyword arguments set by add_scan_arguments' options."""
+    return dict(exclude=args.exclude, include=args.include, min_size=args.min_size,
+                max_size=args.max_size, one_filesystem=args.one_file_system)
+
+
+def group_by_size(files):
+    """Map size -> paths for every size shared by at least two of files.
+
+    A size seen once only keeps its path in a side table, so singletons never
+    get a group of their own.
+    """
+    first, groups = {}, {}
+    for path, size in files:
+        if size in groups:
+            groups[size].append(path)
+        elif size in first:
+            groups[size] = [first.pop(size), path]
+        else:
+            first[size] = path
+    return groups
+
+
+def same_size(root, **filters):
+    """Groups of files under root that have the same size.
+
+    filters are passed on to scan.
+    """
+    return group_by_size(scan(root, **filters))
+
+
+def new_hasher(algorithm):
+    """Return a new hash object for algorithm.
+
+    Anything hashlib knows works ('md5', 'sha1', 'blake2b', ...), as do
+    'xxh64' and 'xxh3_64' when the xxhash package is installed.
+    """
+    if algorithm.startswith('xxh'):
+        import xxhash
+        return getattr(xxhash, algorithm)()
+    return hashlib.new(algorithm)
+
+
+def partial_hash(path, size, algorithm='md5'):
+    """Hash of the first and last EDGE_SIZE bytes of a file (all of it if smaller)."""
+    digest = new_hasher(algorithm)
+    with open(path, 'rb') as file_p:
+        digest.update(file_p.read(EDGE_SIZE))
+        if size > 2 * EDGE_SIZE:
+            file_p.seek(size - EDGE_SIZE)
+            digest.update(file_p.read(EDGE_SIZE))
+        elif size > EDGE_SIZE:
+            digest.update(file_p.read())
+    return digest.hexdigest()
+
+
+def full_hash(path, algorithm='md5'):
+    """Hash of the whole file, read CHUNK_SIZE bytes at a time."""
+    digest = new_hasher(algorithm)
+    with open(path, 'rb') as file_p:
+        for chunk in iter(lambda: file_p.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_rotational(dev):
+    """True if dev is a spinning disk, as far as Linux sysfs can tell."""
+    block = '/sys/dev/block/%d:%d' % (os.major(dev), os.minor(dev))
+    # a partition keeps its queue settings on the parent disk
+    for queue in (block + '/queue/rotational', block + '/../queue/rotational'):
+        try:
+            with open(queue) as flag:
+                return flag.read().strip() == '1'
+        except OSError:
+            continue
+    return False
+
+
+def run_jobs(func, jobs, workers=1, processes=False, per_device=None):
+    """Yield (path, args, func(path, *args)) for each (path, args) of jobs.
+
+    With more than one worker the calls run on a thread pool (a process pool
+    if processes is true) and results are yielded as they complete. At most
+    per_device calls touch the same device at once; by default that is one
+    for spinning disks and workers for anything else. Calls raising OSError
+    are dropped.
+    """
+    if workers <= 1:
+        for path, args in jobs:
+            try:
+                yield path, args, func(path, *args)
+            except OSError:
+                continue
+        return
+
+    queues = {}
+    for path, args in jobs:
+        try:
+            dev = os.stat(path).st_dev
+        except OSError:
+            continue
+        queues.setdefault(dev, collections.deque()).append((path, args))
+
+    limits = {}
+    for dev in queues:
+        if per_device:
+            limits[dev] = per_device
+        else:
+            limits[dev] = 1 if is_rotational(dev) else workers
+
+    busy = collections.Counter()
+    in_flight = {}
+    executor_class = (concurrent.futures.ProcessPoolExecutor if processes
+                      else concurrent.futures.ThreadPoolExecutor)
+
+    with executor_class(workers) as executor:
+
+        def fill():
+            # keep every device as busy as its limit allows, and the pool
+            # a little ahead of its workers
+            for dev, queue in queues.items():
+                while queue and busy[dev] < limits[dev] and len(in_flight) < 2 * workers:
+                    path, args = queue.popleft()
+                    in_flight[executor.submit(func, path, *args)] = (path, args, dev)
+                    busy[dev] += 1
+
+        fill()
+        while in_flight:
+            done, _ = concurrent.futures.wait(
+                in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                path, args, dev = in_flight.pop(future)
+                busy[dev] -= 1
+                try:
+                    result = future.result()
+                except OSError:
+                    continue
+                yield path, args, result
+            fill()
+
+
+def same_bytes(paths, stride=STRIDE):
+    """Split paths into classes of byte-identical files.
+
+    Every file is memory-mapped and the files are compared stride bytes at a
+    time, so at most len(paths) * stride bytes are copied at once. Files of
+    different sizes never share a class. A class stops being compared as soon
+    as it is down to one file, and the whole comparison as soon as every
+    class is.
+    """
+    maps = []
+    try:
+        by_size = {}
+        for path in paths:
+            with open(path, 'rb') as file_p:
+                size = os.fstat(file_p.fileno()).st_size
+                # an empty file cannot be mapped, and has nothing to compare
+                mapped = mmap.mmap(file_p.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+            maps.append(mapped)
+            by_size.setdefault(size, []).append((path, mapped))
+
+        classes = list(by_size.values())
+        offset = 0
+        end = max(by_size)
+        while offset < end and any(len(cls) > 1 for cls in classes):
+            split = []
+            for cls in classes:
+                blocks = [(m, m[1][offset:offset + stride]) for m in cls] if len(cls) > 1 else []
+                while blocks:
+                    first = blocks[0][1]
+                    split.append([m for m, block in blocks if block == first])
+                    blocks = [(m, block) for m, block in blocks if block != first]
+                if len(cls) == 1:
+                    split.append(cls)
+            classes = split
+            offset += stride
+
+        return [[path for path, _ in cls] for cls in classes]
+    finally:
+        for mapped in maps:
+            if mapped is not None:
+                mapped.close()
+
+
+def confirm(group, at_once=MAX_OPEN, stride=STRIDE):
+    """Byte-for-byte check of a group of supposedly identical files.
+
+    Files are compared at_once at a time, the first file of the group taking
+    part in every batch. Files that turn out to differ from it are checked
+    among themselves the same way afterwards. Returns the groups of at least
+    two identical files.
+    """
+    reference = group[0]
+    matches = [reference]
+    leftover = []
+
+    try:
+        for start in range(1, len(group), at_once - 1):
+            batch = [reference] + group[start:start + at_once - 1]
+            for cls in same_bytes(batch, stride):
+                if cls[0] == reference:
+                    matches.extend(cls[1:])
+                else:
+                    leftover.extend(cls)
+    except (OSError, ValueError):
+        # a file vanished or could not be mapped: nothing in the group is certain
+        return []
+
+    confirmed = [matches] if len(matches) > 1 else []
+    if len(leftover) > 1:
+        confirmed.extend(confirm(leftover, at_once, stride))
+    return confirmed
+
+
+def uncached(paths, algorithm, stage, cache, stats, found):
+    """Yield the paths whose stage digest is not in cache.
+
+    Cached digests go straight to found(path, digest); stats keeps the
+    os.stat of each path looked up, for storing the new digests later.
+    """
+    for path in paths:
+        if cache is None:
+            yield path
+            continue
+        try:
+            st = stats[path] = os.stat(path)
+        except OSError:
+            continue
+        digest = cache.lookup(path, st, algorithm, stage)
+        if digest is None:
+            yield path
+        else:
+            found(path, digest)
+
+
+def find_duplicates(root, algorithm='md5', workers=1, processes=False, per_device=None,
+                    cache=None, verify=False, on_stage=None, **filters):
+    """Groups of files under root with identical contents.
+
+    Files are compared in stages, each one only looking at what the previous
+    one could not tell apart: size, then a hash of both ends of the file,
+    then a hash of the whole file. Files no larger than 2 * EDGE_SIZE are
+    settled by the partial hash already. Hashing runs through run_jobs, so
+    workers, processes and per_device are passed on to it. Digests are read
+    from and saved to cache (a hashcache.HashCache) when one is given. With
+    verify, every group is finally compared byte for byte by confirm.
+    on_stage, if given, is called with the name of each stage ('scan',
+    'partial', 'full', 'verify') as it starts. filters are passed on to scan.
+    """
+    if on_stage is None:
+        on_stage = lambda stage: None
+    pool = dict(workers=workers, processes=processes, per_device=per_device)
+    stats = {}
+    sizes = {}
+
+    partial = {}
+
+    def found_partial(path, digest):
+        partial.setdefault((sizes[path], digest), []).append(path)
+
+    on_stage('scan')
+    for size, paths in same_size(root, **filters).items():
+        for path in paths:
+            sizes[path] = size
+
+    on_stage('partial')
+    partial_jobs = ((path, (sizes[path], algorithm))
+                    for path in uncached(list(sizes), algorithm, 'partial', cache, stats, found_partial))
+    for path, _, digest in run_jobs(partial_hash, partial_jobs, **pool):
+        found_partial(path, digest)
+        if cache is not None:
+            cache.store(path, stats[path], algorithm, 'partial', digest)
+
+    duplicates = []
+    candidates = []
+    for (size, _), group in partial.items():
+        if len(group) < 2:
+            continue
+        if size <= 2 * EDGE_SIZE:
+            duplicates.append(group)
+        else:
+            candidates.extend(group)
+
+    full = {}
+
+    def found_full(path, digest):
+        full.setdefault((sizes[path], digest), []).append(path)
+
+    on_stage('full')
+    full_jobs = ((path, (algorithm,))
+                 for path in uncached(candidates, algorithm, 'full', cache, stats, found_full))
+    for path, _, digest in run_jobs(full_hash, full_jobs, **pool):
+        found_full(path, digest)
+        if cache is not None:
+            cache.store(path, stats[path], algorithm, 'full', digest)
+
+    if cache is not None:
+        cache.evict(root, algorithm)
+
+    duplicates.extend(group for group in full.values() if len(group) > 1)
+
+    if verify:
+        on_stage('verify')
+        duplicates = [confirmed for group in duplicates for confirmed in confirm(group)]
+    return duplicates
@@ -2,44 +2,42 @@
 # Pro-Panda
 # To find and remove duplicate files in the computer
 
-import sys
+import argparse
 import os
-import filecmp
+import dedupe
+import dupfinder as d
 
-path = sys.argv[1]  # Sample Input: /home/PP/media_files/
-file_size, size = [], []
+parser = argparse.ArgumentParser(description="Find and remove files of the same size.")
+parser.add_argument("path", help="folder to look in")  # Sample Input: /home/PP/media_files/
+parser.add_argument("--verify", action="store_true",
+                    help="only keep files that are identical byte for byte")
+d.add_scan_arguments(parser)
+dedupe.add_batch_arguments(parser)
+args = parser.parse_args()
 
-for root, dirt, files in os.walk(path):
-    for file in files:
-        temp_path = os.path.join(root, file)
-        file_size.append([os.stat(temp_path).st_size, temp_path])
-        size.append(os.stat(temp_path).st_size)
+# same size alone is no reason to delete anything unattended
+if args.batch and not args.verify and not args.dry_run:
+    parser.error("--batch needs --verify (or --dry-run)")
 
-duplicate_size = [x for x in size if size.count(x) > 1]
-duplicates = [x for x in file_size if duplicate_size.count(x[0]) > 0]
+duplicates = list(d.same_size(args.path, **d.scan_filters(args)).values())
 
-len_dup = len(duplicates)
+if args.verify:
+    duplicates = [same for group in duplicates for same in d.confirm(group)]
 
-x, y = 0, 0
-while x < len_dup:
-    y = x + 1
-    while y < len_dup:
-        if(duplicates[x][0] == duplicates[y][0]):
-            duplicates[x].append(duplicates[y][1])
-            duplicates.pop(y)
-            y = y - 1
-            len_dup = len_dup - 1
-        y = y + 1
-    x = x + 1
+if args.batch or args.report or args.dry_run:
+    if not args.batch:
+        args.dry_run = True
+    dedupe.run_batch(duplicates, args)
+    duplicates = []
 
-for x in range(len(duplicates)):
-    for y in range(1, len(duplicates[x])):
-        print str(y) + '. ' + duplicates[x][y]
-    file_no = raw_input("Which file(s) do you want to delete ?")
-    if(file_no='0'):
+for group in duplicates:
+    for y in range(len(group)):
+        print(str(y + 1) + '. ' + group[y])
+    file_no = input("Which file(s) do you want to delete ?")
+    if(file_no == '0'):
         continue
     file_no = file_no.split(',')
     file_no = [int(r) for r in file_no]
     for j in file_no:
-        os.remove(duplicates[x][j])
-    print "Files successfully removed/n"
+        os.remove(group[j - 1])
+    print("Files successfully removed\n")
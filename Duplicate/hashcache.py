@@ -0,0 +1,115 @@
+# Persistent cache of file digests, so unchanged files are not hashed again
+
+import os
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    dev INTEGER,
+    ino INTEGER,
+    algorithm TEXT,
+    size INTEGER,
+    mtime INTEGER,
+    path TEXT,
+    partial TEXT,
+    full TEXT,
+    seen REAL,
+    PRIMARY KEY (dev, ino, algorithm)
+);
+"""
+
+COMMIT_EVERY = 1000
+
+
+class HashCache(object):
+    """Partial and full digests keyed by (st_dev, st_ino, algorithm).
+
+    An entry only counts while the file keeps the size and mtime it was
+    hashed with. Entries looked up or stored are stamped with the time of the
+    run, and evict() checks the ones under a root that were not, dropping
+    those of files deleted or changed since they were hashed.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.started = time.time()
+        self.pending = 0
+        self.hits = self.misses = self.evicted = 0
+
+    def _written(self):
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.conn.commit()
+            self.pending = 0
+
+    def lookup(self, path, st, algorithm, stage):
+        """Cached digest of path for stage ('partial' or 'full'), or None."""
+        row = self.conn.execute(
+            "SELECT size, mtime, partial, full FROM hashes WHERE dev = ? AND ino = ? AND algorithm = ?",
+            (st.st_dev, st.st_ino, algorithm)).fetchone()
+
+        digest = None
+        if row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            digest = row[2] if stage == 'partial' else row[3]
+            self.conn.execute(
+                "UPDATE hashes SET seen = ?, path = ? WHERE dev = ? AND ino = ? AND algorithm = ?",
+                (self.started, os.path.abspath(path), st.st_dev, st.st_ino, algorithm))
+            self._written()
+
+        if digest is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return digest
+
+    def store(self, path, st, algorithm, stage, digest):
+        key = (st.st_dev, st.st_ino, algorithm)
+        row = self.conn.execute(
+            "SELECT size, mtime FROM hashes WHERE dev = ? AND ino = ? AND algorithm = ?", key).fetchone()
+
+        # a changed file starts over, dropping the digest of the other stage
+        if row is None or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+            self.conn.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, NULL, NULL, ?)",
+                              key + (st.st_size, st.st_mtime_ns, os.path.abspath(path), self.started))
+
+        self.conn.execute(
+            "UPDATE hashes SET " + stage + " = ?, seen = ? WHERE dev = ? AND ino = ? AND algorithm = ?",
+            (digest, self.started) + key)
+        self._written()
+
+    def evict(self, root, algorithm):
+        """Drop the algorithm's entries under root whose file is gone or has changed.
+
+        Only entries this run did not use are looked at; the ones of files
+        that were merely skipped (filtered out, or no longer sharing their
+        size with another file) are kept.
+        """
+        prefix = os.path.join(os.path.abspath(root), '')
+        rows = self.conn.execute(
+            "SELECT dev, ino, size, mtime, path FROM hashes "
+            "WHERE algorithm = ? AND seen < ? AND substr(path, 1, ?) = ?",
+            (algorithm, self.started, len(prefix), prefix)).fetchall()
+
+        for dev, ino, size, mtime, path in rows:
+            try:
+                st = os.stat(path)
+                if (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns) == (dev, ino, size, mtime):
+                    continue
+            except OSError:
+                pass
+            self.conn.execute("DELETE FROM hashes WHERE dev = ? AND ino = ? AND algorithm = ?",
+                              (dev, ino, algorithm))
+            self.evicted += 1
+        self.conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return "hash cache: %d hits, %d misses (%.1f%% hit rate), %d evicted" % (
+            self.hits, self.misses, rate, self.evicted)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -1,43 +1,72 @@
 #!usr/bin/python
 
+import argparse
 import os
-import hashlib
-hasher = hashlib.md5()
-
-# Example : /home/PP/Courses/
-path = raw_input("Please enter the path of the root directory:")
-
-file_size, size, md5_list = [], [], []
-
-for root, dirt, files in os.walk(path):
-    for file in files:
-        temp_path = os.path.join(root, file)
-        file_size.append([temp_path, os.stat(temp_path).st_size])
-        size.append(os.stat(temp_path).st_size)
-duplicate_size = [x for x in size if size.count(x) > 1]
-duplicates = [x for x in file_size if duplicate_size.count(x[1]) > 0]
-
-for x in range(len(duplicates)):
-    file_p = open(duplicates[x][0], 'rb')
-    temp_var = hasher.update(file_p.read())
-    md5_file = (str(hasher.hexdigest()))
-    duplicates[x].append(md5_file)
-    md5_list.append(md5_file)
-
-md5_duplicate = [x for x in md5_list if md5_list.count(x) > 1]
-
-final = [x for x in duplicates if md5_duplicate.count(x[2]) > 0]
-
-for x in range(len(duplicates)):
-    for y in range(x + 1, len(duplicates)):
-        if(duplicates[x][2] == duplicates[y][2]):
-            print "1.", duplicates[x][0], "\n2.", duplicates[y][0]
-            num = int(
-                raw_input("Enter the file number you want to delete (Enter 0 to skip):"))
-            if(num == 1):
-                os.remove(duplicates[x][0])
-                print("File successfully removed")
-                break
-            elif(num == 2):
-                os.remove(duplicates[y][0])
-                print("File successfully removed")
+import dedupe
+import dupfinder as d
+import hashcache as h
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find and remove duplicate files.")
+    parser.add_argument("algorithm", nargs="?", default="md5",
+                        help="hash algorithm, e.g. blake2b or xxh64 (default: md5)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="files hashed at the same time (default: 1)")
+    parser.add_argument("--processes", action="store_true",
+                        help="hash in worker processes instead of threads")
+    parser.add_argument("--per-device", type=int,
+                        help="files hashed at the same time on one device (default: 1 for "
+                             "spinning disks, --workers for anything else)")
+    parser.add_argument("--cache",
+                        help="file to keep digests in between runs, so unchanged files "
+                             "are not hashed again")
+    parser.add_argument("--verify", action="store_true",
+                        help="compare duplicates byte for byte before offering to delete them")
+    parser.add_argument("--path", help="root directory (asked for when not given)")
+    d.add_scan_arguments(parser)
+    dedupe.add_batch_arguments(parser)
+    args = parser.parse_args()
+
+    # Example : /home/PP/Courses/
+    path = args.path or input("Please enter the path of the root directory:")
+
+    cache = h.HashCache(args.cache) if args.cache else None
+    duplicates = d.find_duplicates(path, args.algorithm, args.workers,
+                                   args.processes, args.per_device, cache, args.verify,
+                                   **d.scan_filters(args))
+    if cache is not None:
+        print(cache.stats())
+        cache.close()
+
+    if args.batch or args.report or args.dry_run:
+        if not args.batch:
+            args.dry_run = True
+        dedupe.run_batch(duplicates, args)
+        duplicates = []
+
+    removed = set()
+
+    for group in duplicates:
+        for x in range(len(group)):
+            if group[x] in removed:
+                continue
+            for y in range(x + 1, len(group)):
+                if group[y] in removed:
+                    continue
+                print("1.", group[x], "\n2.", group[y])
+                num = int(
+                    input("Enter the file number you want to delete (Enter 0 to skip):"))
+                if(num == 1):
+                    os.remove(group[x])
+                    removed.add(group[x])
+                    print("File successfully removed")
+                    break
+                elif(num == 2):
+                    os.remove(group[y])
+                    removed.add(group[y])
+                    print("File successfully removed")
+
+
+if __name__ == '__main__':
+    main()
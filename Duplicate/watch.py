@@ -0,0 +1,230 @@
+#!usr/bin/python
+# Keeps a live duplicate index of a folder and reports new duplicates as they appear
+# Linux only: changes are picked up through inotify
+
+import argparse
+import os
+import stat
+import dupfinder as d
+import inotify
+
+WATCH_MASK = (inotify.IN_CREATE | inotify.IN_CLOSE_WRITE | inotify.IN_DELETE |
+              inotify.IN_MOVED_FROM | inotify.IN_MOVED_TO | inotify.IN_ONLYDIR)
+
+
+class DuplicateIndex(object):
+    """Files grouped by size, and by full digest once a size is shared.
+
+    Adding or removing a file only touches its own size group: the members of
+    a group are hashed the first time it holds two files, and every file is
+    hashed at most once until it changes.
+    """
+
+    def __init__(self, algorithm='md5'):
+        self.algorithm = algorithm
+        self.files = {}      # path -> (size, (st_dev, st_ino)), one name per file
+        self.by_size = {}    # size -> paths
+        self.digests = {}    # path -> digest
+        self.by_digest = {}  # (size, digest) -> paths
+        # every name of every file, so hard links count once: the first name
+        # of an inode is the one indexed, and the next takes over when it goes
+        self.links = {}      # path -> (st_dev, st_ino)
+        self.inodes = {}     # (st_dev, st_ino) -> paths
+
+    def add(self, path, st):
+        """Index path (re-indexing it if known) and return the files it duplicates."""
+        self.remove(path)
+
+        key = (st.st_dev, st.st_ino)
+        self.links[path] = key
+        names = self.inodes.setdefault(key, [])
+        names.append(path)
+        if len(names) > 1:
+            # another name of a file that is indexed already
+            return []
+        return self.index(path, st.st_size, key)
+
+    def index(self, path, size, key, digest=None):
+        self.files[path] = (size, key)
+        group = self.by_size.setdefault(size, set())
+        group.add(path)
+        if digest is not None:
+            self.digests[path] = digest
+            self.by_digest.setdefault((size, digest), set()).add(path)
+        if len(group) < 2:
+            return []
+
+        for member in group:
+            if member not in self.digests:
+                self.hash(member)
+        if path not in self.digests:
+            return []
+        return sorted(self.by_digest[(size, self.digests[path])] - set([path]))
+
+    def hash(self, path):
+        try:
+            digest = d.full_hash(path, self.algorithm)
+        except OSError:
+            return
+        self.digests[path] = digest
+        self.by_digest.setdefault((self.files[path][0], digest), set()).add(path)
+
+    def remove(self, path):
+        key = self.links.pop(path, None)
+        if key is None:
+            return
+        names = self.inodes[key]
+        names.remove(path)
+        if not names:
+            del self.inodes[key]
+        if path not in self.files:
+            return
+
+        size, key = self.files.pop(path)
+        self.by_size[size].discard(path)
+        if not self.by_size[size]:
+            del self.by_size[size]
+
+        digest = self.digests.pop(path, None)
+        if digest is not None:
+            self.by_digest[(size, digest)].discard(path)
+            if not self.by_digest[(size, digest)]:
+                del self.by_digest[(size, digest)]
+
+        # the file lives on under another name, with the same contents
+        if names:
+            self.index(names[0], size, key, digest)
+
+    def remove_tree(self, directory):
+        prefix = os.path.join(directory, '')
+        for path in [path for path in self.links if path.startswith(prefix)]:
+            self.remove(path)
+
+    def groups(self):
+        return [sorted(paths) for paths in self.by_digest.values() if len(paths) > 1]
+
+
+class Watcher(object):
+    """Feeds the changes inotify reports under root into a DuplicateIndex."""
+
+    def __init__(self, root, index, filters):
+        self.root = root
+        self.index = index
+        self.filters = filters
+        self.notify = inotify.Inotify()
+        self.directories = {}  # watch descriptor -> directory
+
+    def watch(self, directory):
+        try:
+            wd = self.notify.add_watch(directory, WATCH_MASK)
+        except OSError:
+            return
+        self.directories[wd] = directory
+
+    def unwatch_tree(self, directory):
+        prefix = os.path.join(directory, '')
+        for wd, watched in list(self.directories.items()):
+            if watched == directory or watched.startswith(prefix):
+                self.notify.rm_watch(wd)
+                del self.directories[wd]
+
+    def add_tree(self, directory):
+        # every directory is watched before it is read, so nothing created
+        # while the tree is scanned goes unnoticed; every name of a hard
+        # linked file is passed on, so the index knows them all
+        for path, size in d.scan(directory, on_directory=self.watch, top=self.root, all_links=True,
+                                 **self.filters):
+            self.file_changed(path)
+
+    def wanted(self, path, st):
+        name = os.path.basename(path)
+        relative = os.path.relpath(path, self.root)
+        if self.filters['exclude'] and d.matches(self.filters['exclude'], name, relative):
+            return False
+        if self.filters['include'] and not d.matches(self.filters['include'], name, relative):
+            return False
+        max_size = self.filters['max_size']
+        return self.filters['min_size'] <= st.st_size and (max_size is None or st.st_size <= max_size)
+
+    def file_changed(self, path):
+        try:
+            st = os.lstat(path)
+        except OSError:
+            self.index.remove(path)
+            return
+        if not stat.S_ISREG(st.st_mode) or not self.wanted(path, st):
+            self.index.remove(path)
+            return
+
+        same = self.index.add(path, st)
+        if same:
+            print("duplicate: " + path + " == " + ", ".join(same))
+
+    def handle(self, event):
+        if event.mask & inotify.IN_Q_OVERFLOW:
+            # events were lost: start over from a fresh scan
+            print("inotify queue overflowed, rescanning " + self.root)
+            self.unwatch_tree(self.root)
+            self.index.remove_tree(self.root)
+            self.add_tree(self.root)
+            return
+
+        directory = self.directories.get(event.wd)
+        if directory is None:
+            return
+        if event.mask & inotify.IN_IGNORED:
+            del self.directories[event.wd]
+            return
+
+        path = os.path.join(directory, event.name)
+
+        if event.mask & inotify.IN_ISDIR:
+            if event.mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO):
+                relative = os.path.relpath(path, self.root)
+                if not (self.filters['exclude'] and
+                        d.matches(self.filters['exclude'], event.name, relative)):
+                    self.add_tree(path)
+            elif event.mask & (inotify.IN_DELETE | inotify.IN_MOVED_FROM):
+                self.unwatch_tree(path)
+                self.index.remove_tree(path)
+        elif event.mask & (inotify.IN_DELETE | inotify.IN_MOVED_FROM):
+            self.index.remove(path)
+        elif event.mask & (inotify.IN_CLOSE_WRITE | inotify.IN_MOVED_TO):
+            self.file_changed(path)
+        elif event.mask & inotify.IN_CREATE:
+            # a new hard link never gets written to, other new files are
+            # indexed once they are closed
+            try:
+                if os.lstat(path).st_nlink > 1:
+                    self.file_changed(path)
+            except OSError:
+                pass
+
+    def run(self):
+        while True:
+            for event in self.notify.read():
+                self.handle(event)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report duplicate files in a folder as they appear.")
+    parser.add_argument("path", help="folder to watch")
+    parser.add_argument("--algorithm", default="md5",
+                        help="hash algorithm, e.g. blake2b or xxh64 (default: md5)")
+    d.add_scan_arguments(parser)
+    args = parser.parse_args()
+
+    index = DuplicateIndex(args.algorithm)
+    watcher = Watcher(args.path, index, d.scan_filters(args))
+    watcher.add_tree(args.path)
+    print("watching " + args.path + ": " + str(len(index.files)) + " files, " +
+          str(len(index.groups())) + " duplicate groups")
+
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
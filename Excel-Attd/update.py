@@ -1,27 +1,163 @@
 # Pro-Panda
 # to ease the burden of filling attendance sheets for CP Lectures for CP
 # Lab TAs
-import sys
+import argparse
+import os
+import shutil
+import tempfile
 import openpyxl
+from openpyxl.utils import column_index_from_string
 
-wb = openpyxl.load_workbook(sys.argv[2])
-sheet = wb.active
-xl_file = open(sys.argv[1], 'rw')
-
-while(1):
-    ID_present = (xl_file.readline()).strip()
-    if (ID_present == '' or len(ID_present) > 4):
-        break
-    if (len(ID_present) < 4):
-        ID_present = ((4 - len(ID_present)) * '0') + ID_present
-    runner = 1
-    while(1):
-        runner = runner + 1
-        ID_sheet = (sheet['B' + str(runner)].value)
+ID_COLUMN = 2  # column B holds the full IDs, e.g. 2016A7PS0112P
+
+
+def read_ids(path):
+    """The IDs of an attendance list, padded to 4 digits.
+
+    The list ends at the first empty line or at anything longer than 4 characters.
+    """
+    ids = []
+    with open(path) as xl_file:
+        for line in xl_file:
+            ID_present = line.strip()
+            if (ID_present == '' or len(ID_present) > 4):
+                break
+            ids.append(ID_present.zfill(4))
+    return ids
+
+
+def roster_index(sheet):
+    """Map the 4 digit ID of each student to their row, reading column B once.
+
+    The roster starts at row 2 and ends at the first empty cell of column B.
+    """
+    index = {}
+    rows = sheet.iter_rows(min_row=2, min_col=ID_COLUMN, max_col=ID_COLUMN, values_only=True)
+    for row, (ID_sheet,) in enumerate(rows, 2):
         if (ID_sheet is None):
             break
-        ID_sheet = ID_sheet[8:12]
-        if(ID_sheet == ID_present):
-            sheet[sys.argv[3] + str(runner)] = 1
-            break
-wb.save(sys.argv[2])
+        index.setdefault(ID_sheet[8:12], row)
+    return index
+
+
+def mark(sheet, index, ids, column):
+    """Put a 1 in column for every ID of ids; return the IDs not in the roster."""
+    missing = []
+    for ID_present in ids:
+        row = index.get(ID_present)
+        if row is None:
+            missing.append(ID_present)
+        else:
+            sheet[column + str(row)] = 1
+    return missing
+
+
+def parse_sessions(specs):
+    # "attendance_list:column" pairs; the path may contain colons itself
+    sessions = []
+    for spec in specs:
+        path, _, column = spec.rpartition(':')
+        if not path or not column.isalpha():
+            raise ValueError("expected <attendance_list>:<column>, got " + spec)
+        sessions.append((path, column.upper()))
+    return sessions
+
+
+def update(spreadsheet, sessions):
+    """Mark every (attendance_list, column) of sessions with one load and save."""
+    wb = openpyxl.load_workbook(spreadsheet)
+    sheet = wb.active
+    index = roster_index(sheet)
+    for path, column in sessions:
+        missing = mark(sheet, index, read_ids(path), column)
+        if missing:
+            print(path + ": not in the roster: " + ", ".join(missing))
+    wb.save(spreadsheet)
+
+
+def update_streaming(spreadsheet, sessions):
+    """Same as update, in bounded memory for rosters too large to load whole.
+
+    The spreadsheet is read row by row from a read-only workbook and every
+    sheet is copied into a write-only workbook, with the marks added on the
+    way. Only cell values survive: formatting, column widths and merged
+    cells are not carried over.
+    """
+    # column number -> IDs still to mark in it; a column may take several lists
+    pending = {}
+    for path, column in sessions:
+        pending.setdefault(column_index_from_string(column), set()).update(read_ids(path))
+
+    source = openpyxl.load_workbook(spreadsheet, read_only=True)
+    target = openpyxl.Workbook(write_only=True)
+    active = source.sheetnames.index(source.active.title)
+
+    for number, sheet in enumerate(source.worksheets):
+        copy = target.create_sheet(sheet.title)
+        # the stored dimensions of large merged files are not always right
+        sheet.reset_dimensions()
+        in_roster = number == active
+        for row, values in enumerate(sheet.iter_rows(values_only=True), 1):
+            values = list(values)
+            if in_roster and row >= 2:
+                ID_sheet = values[ID_COLUMN - 1] if len(values) >= ID_COLUMN else None
+                if (ID_sheet is None):
+                    in_roster = False
+                else:
+                    ID_sheet = ID_sheet[8:12]
+                    for column, ids in pending.items():
+                        if ID_sheet in ids:
+                            ids.discard(ID_sheet)
+                            values.extend([None] * (column - len(values)))
+                            values[column - 1] = 1
+            copy.append(values)
+
+    target.active = active
+    source.close()
+
+    # written next to the spreadsheet, then moved over it once complete
+    handle, temp = tempfile.mkstemp(suffix='.xlsx', dir=os.path.dirname(os.path.abspath(spreadsheet)))
+    os.close(handle)
+    try:
+        target.save(temp)
+        # mkstemp files are private to their owner; keep the roster's permissions
+        shutil.copymode(spreadsheet, temp)
+        os.replace(temp, spreadsheet)
+    except BaseException:
+        os.remove(temp)
+        raise
+
+    missing = sorted(set().union(*pending.values()))
+    if missing:
+        print("not in the roster: " + ", ".join(missing))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mark attendance in an Excel sheet from lists of IDs.",
+        usage="%(prog)s <attendance_list> <Spreadsheet_name> <Column_Name_for_attendance>\n"
+              "       %(prog)s --sessions <Spreadsheet_name> <attendance_list>:<column> ...")
+    parser.add_argument("files", nargs="+", help=argparse.SUPPRESS)
+    parser.add_argument("--sessions", action="store_true",
+                        help="update one column per attendance list, e.g. lec1.txt:C lec2.txt:D")
+    parser.add_argument("--streaming", action="store_true",
+                        help="stream the workbook in and out in bounded memory (keeps values, not formatting)")
+    args = parser.parse_args()
+    engine = update_streaming if args.streaming else update
+
+    if args.sessions:
+        if len(args.files) < 2:
+            parser.error("--sessions needs a spreadsheet and at least one <attendance_list>:<column>")
+        try:
+            sessions = parse_sessions(args.files[1:])
+        except ValueError as e:
+            parser.error(str(e))
+        engine(args.files[0], sessions)
+    else:
+        if len(args.files) != 3:
+            parser.error("expected <attendance_list> <Spreadsheet_name> <Column_Name_for_attendance>")
+        engine(args.files[1], [(args.files[0], args.files[2])])
+
+
+if __name__ == '__main__':
+    main()
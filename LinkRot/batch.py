@@ -0,0 +1,142 @@
+# Crawls many sites in one process, sharing the connection pool and link statuses
+# Usage: python batch.py seeds.txt --out results
+import argparse
+import concurrent.futures
+import hashlib
+import os
+import threading
+import time
+
+import finder as f
+import httpcache as h
+import pool as p
+import sldextract as s
+
+
+def read_seeds(path):
+	# one url per line; blank lines, # comments and repeated urls are skipped,
+	# as two crawls of one seed would write to the same directory
+	seeds = []
+	seen = set()
+	with open(path) as seed_file:
+		for line in seed_file:
+			line = line.strip()
+			if line and not line.startswith("#") and line not in seen:
+				seen.add(line)
+				seeds.append(line)
+	return seeds
+
+
+def site_dir(out, url):
+	# seeds on the same host each get their own directory, e.g. example.com-1a2b3c4d
+	digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]
+	return os.path.join(out, (s.host_of(url) or "site") + "-" + digest)
+
+
+def crawl_site(url, out, make_options):
+	directory = site_dir(out, url)
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+
+	checked_file = open(os.path.join(directory, "checked_urls.csv"), "w")
+	broken_file = open(os.path.join(directory, "broken_urls.csv"), "w")
+
+	checked_file.write(f.headers_checked_file)
+	broken_file.write(f.headers_broken_file)
+
+	start = time.time()
+	crawler = f.Crawler(url, checked_file, broken_file, **make_options())
+	crawler.crawl()
+
+	checked_file.close()
+	broken_file.close()
+
+	return crawler.count, len(crawler.broken_links), time.time() - start
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Find broken links on every site listed in a file.")
+	parser.add_argument("seeds", help="file with one url to start crawling from per line")
+	parser.add_argument("--out", default="linkrot_results",
+						help="directory for the per-site results and summary.csv (default: linkrot_results)")
+	parser.add_argument("--sites", type=int, default=4,
+						help="sites crawled at the same time (default: 4)")
+	parser.add_argument("-w", "--workers", type=int, default=8,
+						help="concurrent fetchers per site (default: 8)")
+	parser.add_argument("--max-body", type=int, default=5 * 1024 * 1024,
+						help="bytes of a page to download and parse at most (default: 5 MiB)")
+	parser.add_argument("--src", action="store_true",
+						help="also check src links (images, scripts, frames)")
+	parser.add_argument("--timeout", type=float, default=f.TIMEOUT,
+						help="seconds to wait for a connection or for the next bytes of a response "
+							 "(default: %g)" % f.TIMEOUT)
+	parser.add_argument("--per-host", type=int,
+						help="requests in flight to one host at most, per site, 0 for no limit "
+							 "(default: --workers)")
+	parser.add_argument("--rate", type=float, default=0,
+						help="requests per second to one host at most, per site (default: no limit)")
+	parser.add_argument("--http-cache", default="http_cache.sqlite",
+						help="validator cache shared by every site (default: http_cache.sqlite)")
+	parser.add_argument("--no-http-cache", action="store_true",
+						help="always download pages in full")
+	args = parser.parse_args(argv)
+	if args.per_host is None:
+		args.per_host = args.workers
+
+	seeds = read_seeds(args.seeds)
+
+	# shared by every site: one keep-alive pool, one status per link, one validator cache
+	session = p.make_session(args.workers * args.sites)
+	status_cache = {}
+	http_cache = None
+	if not args.no_http_cache:
+		http_cache = h.ValidatorCache(args.http_cache)
+	s.suffix_index()
+
+	def make_options():
+		# a fresh scheduler for each site, everything else shared
+		return dict(workers=args.workers, max_body=args.max_body, include_src=args.src,
+					timeout=args.timeout, http_cache=http_cache, session=session, status_cache=status_cache,
+					frontier=p.Scheduler(args.per_host, args.rate))
+
+	results = {}
+	results_lock = threading.Lock()
+
+	def run(url):
+		try:
+			result = crawl_site(url, args.out, make_options) + ("",)
+		except Exception as e:
+			result = (0, 0, 0.0, repr(e))
+		with results_lock:
+			results[url] = result
+
+	try:
+		with concurrent.futures.ThreadPoolExecutor(args.sites) as executor:
+			list(executor.map(run, seeds))
+	finally:
+		if http_cache is not None:
+			http_cache.close()
+
+	if not os.path.isdir(args.out):
+		os.makedirs(args.out)
+
+	summary_file = open(os.path.join(args.out, "summary.csv"), "w")
+	summary_file.write("site,checked,broken,seconds,error\n")
+	total_checked = total_broken = 0
+
+	for url in seeds:
+		checked, broken, seconds, error = results[url]
+		total_checked += checked
+		total_broken += broken
+
+		summary_file.write(url + "," + str(checked) + "," + str(broken) + "," +
+						   "%.1f" % seconds + "," + error.replace(",", ";") + "\n")
+
+	summary_file.close()
+
+	print(str(len(seeds)) + " sites, " + str(total_checked) + " urls checked, " +
+		  str(total_broken) + " broken, " + str(len(status_cache)) + " distinct urls checked")
+
+
+if __name__ == '__main__':
+	main()
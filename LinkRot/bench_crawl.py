@@ -0,0 +1,149 @@
+# Crawls a generated site served from localhost and reports how fast it went
+# Usage: python bench_crawl.py --pages 2000 --fanout 10 --latency 20 --workers 16
+import argparse
+import contextlib
+import io
+import multiprocessing
+import random
+import resource
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import finder as f
+import pool as p
+
+
+def site_graph(pages, fanout, external_ratio, broken_ratio, seed=0):
+	# page number -> list of hrefs; page i always links to page i + 1 so that
+	# every page is reachable from the first one
+	rng = random.Random(seed)
+	graph = {}
+
+	for i in range(pages):
+		links = []
+		if i + 1 < pages:
+			links.append("/page/%d" % (i + 1))
+
+		while len(links) < fanout:
+			roll = rng.random()
+			if roll < broken_ratio:
+				links.append("/missing/%d" % rng.randrange(pages))
+			elif roll < broken_ratio + external_ratio:
+				# "localhost" is a different domain from 127.0.0.1 to the crawler
+				links.append("http://localhost:{port}/external/%d" % rng.randrange(pages))
+			else:
+				links.append("/page/%d" % rng.randrange(pages))
+
+		graph[i] = links
+
+	return graph
+
+
+def serve(port, graph, latency, requests_served, bound_port, ready):
+	class Handler(BaseHTTPRequestHandler):
+		protocol_version = "HTTP/1.1"
+
+		def log_message(self, *args):
+			pass
+
+		def respond(self, send_body):
+			with requests_served.get_lock():
+				requests_served.value += 1
+			if latency:
+				time.sleep(latency)
+
+			path = self.path.split("?")[0]
+			body = b""
+			status = 200
+
+			if path.startswith("/page/") and int(path[6:]) in graph:
+				links = "".join('<li><a href="%s">link</a></li>' % href.format(port=port)
+								for href in graph[int(path[6:])])
+				body = ("<html><body><ul>%s</ul></body></html>" % links).encode("utf-8")
+			elif path.startswith("/external/"):
+				body = b"<html><body>elsewhere</body></html>"
+			else:
+				status = 404
+
+			self.send_response(status)
+			self.send_header("Content-Type", "text/html; charset=utf-8")
+			self.send_header("Content-Length", str(len(body)))
+			self.end_headers()
+			if send_body:
+				self.wfile.write(body)
+
+		def do_GET(self):
+			self.respond(True)
+
+		def do_HEAD(self):
+			self.respond(False)
+
+	server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+	server.daemon_threads = True
+	# port 0 lets the system pick a free one; the handler links to the real one
+	port = bound_port.value = server.server_address[1]
+	ready.set()
+	server.serve_forever()
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Benchmark finder.py against a local synthetic site.")
+	parser.add_argument("--pages", type=int, default=1000)
+	parser.add_argument("--fanout", type=int, default=10, help="links per page")
+	parser.add_argument("--external-ratio", type=float, default=0.2)
+	parser.add_argument("--broken-ratio", type=float, default=0.05)
+	parser.add_argument("--latency", type=float, default=0, help="milliseconds added to every response")
+	parser.add_argument("--port", type=int, default=0, help="default: any free port")
+	parser.add_argument("-w", "--workers", type=int, default=8)
+	parser.add_argument("--per-host", type=int, help="default: --workers, as in finder.py")
+	parser.add_argument("--rate", type=float, default=0)
+	args = parser.parse_args(argv)
+	if args.per_host is None:
+		args.per_host = args.workers
+
+	graph = site_graph(args.pages, args.fanout, args.external_ratio, args.broken_ratio)
+
+	# the server runs in its own process so it does not show up in the crawler's cpu and memory
+	requests_served = multiprocessing.Value("l", 0)
+	bound_port = multiprocessing.Value("i", 0)
+	ready = multiprocessing.Event()
+	server = multiprocessing.Process(target=serve, args=(args.port, graph, args.latency / 1000.0,
+														 requests_served, bound_port, ready))
+	server.daemon = True
+	server.start()
+	# a server that cannot bind its port dies without ever being ready
+	while not ready.wait(0.5):
+		if not server.is_alive():
+			raise SystemExit("the benchmark server exited with code %s" % server.exitcode)
+
+	checked_file = io.StringIO()
+	broken_file = io.StringIO()
+	main_url = "http://127.0.0.1:%d/page/0" % bound_port.value
+
+	crawler = f.Crawler(main_url, checked_file, broken_file, workers=args.workers,
+						frontier=p.Scheduler(args.per_host, args.rate))
+
+	start = time.time()
+	cpu_start = time.process_time()
+	# finder.py prints a line per url, which would dominate the timings
+	with contextlib.redirect_stdout(io.StringIO()):
+		crawler.crawl()
+	wall = time.time() - start
+	cpu = time.process_time() - cpu_start
+
+	server.terminate()
+
+	print("pages in site:     %d (fan-out %d, %.0f%% external, %.0f%% broken, %g ms latency)"
+		  % (args.pages, args.fanout, args.external_ratio * 100, args.broken_ratio * 100, args.latency))
+	print("workers:           %d (%d per host)" % (args.workers, args.per_host))
+	print("urls checked:      %d" % crawler.count)
+	print("broken urls:       %d" % len(crawler.broken_links))
+	print("requests issued:   %d" % requests_served.value)
+	print("wall time:         %.2f s" % wall)
+	print("crawler cpu time:  %.2f s" % cpu)
+	print("pages/sec:         %.1f" % (crawler.count / wall))
+	print("peak rss:          %.1f MiB" % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,51 @@
+# Compares linkextract with the BeautifulSoup parse finder.py used to do
+# Usage: python bench_linkextract.py [saved_page.html ...]
+import random
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+import linkextract as le
+
+
+def synthetic_page(links=5000):
+	# a large page of nested markup, used when no saved pages are given
+	random.seed(0)
+	rows = []
+	for i in range(links):
+		rows.append('<div class="row"><p>Item %d &amp; text</p><a href="/page/%d?x=%d#f">link</a>'
+					'<img src="/img/%d.png"></div>' % (i, i, random.randint(0, 99), i))
+	return ("<html><head><title>bench</title></head><body>" + "".join(rows) + "</body></html>").encode("utf-8")
+
+
+def soup_links(content):
+	soup = BeautifulSoup(content, "html.parser", from_encoding="iso-8859-1")
+	return [link['href'] for link in soup.find_all('a', href=True)]
+
+
+def streamed_links(content, chunk_size=64 * 1024):
+	extractor = le.LinkExtractor(le.detect_encoding("text/html", content))
+	for i in range(0, len(content), chunk_size):
+		extractor.feed_bytes(content[i:i + chunk_size])
+	return extractor.close()
+
+
+def bench(name, content, number=1):
+	soup_time = min(timeit.repeat(lambda: soup_links(content), number=number, repeat=3)) / number
+	stream_time = min(timeit.repeat(lambda: streamed_links(content), number=number, repeat=3)) / number
+
+	assert len(soup_links(content)) == len(streamed_links(content))
+
+	print("%s (%d KiB, %d links)" % (name, len(content) // 1024, len(streamed_links(content))))
+	print("  BeautifulSoup: %8.1f ms" % (soup_time * 1e3))
+	print("  linkextract:   %8.1f ms" % (stream_time * 1e3))
+	print("  speedup:       %8.1fx" % (soup_time / stream_time))
+
+
+if __name__ == '__main__':
+	if len(sys.argv) > 1:
+		for path in sys.argv[1:]:
+			with open(path, 'rb') as f:
+				bench(path, f.read())
+	else:
+		bench("synthetic page", synthetic_page())
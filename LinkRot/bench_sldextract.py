@@ -0,0 +1,64 @@
+# Micro-benchmark of sldextract.extract against the old linear scan
+import timeit
+
+import sldextract as s
+
+
+URLS = [
+	"https://www.example.com/path/to/page",
+	"https://blog.example.co.uk/2017/01/post",
+	"https://docs.python.org/3/library/",
+	"https://shop.example.com.au/cart",
+	"https://sub.domain.example.tsuruga.fukui.jp/",
+	"https://localhost/no/suffix/at/all",
+]
+
+
+def extract_linear(url):
+	# extract() as it was before the suffix index
+	f = open(s.TLD_FILE, 'r')
+
+	tld_list = (f.read()).split(",\n  ")
+	f.close()
+
+	url = url.replace("https://", "")
+	if '/' in url:
+		url = url[:url.index('/')]
+
+	for i in tld_list:
+		if url.endswith(i):
+			url_tld = i
+
+			url = url.replace(url_tld, "")
+			break
+
+	else:
+		url_tld = ""
+
+	url_domain = url.strip('.')
+
+	url_contents = {"url_domain": url_domain, "url_tld": url_tld}
+	return url_contents
+
+
+def run(func, number):
+	return min(timeit.repeat(lambda: [func(url) for url in URLS], number=number, repeat=3))
+
+
+if __name__ == '__main__':
+	number = 200
+
+	build = timeit.timeit(s.load_suffixes, number=10) / 10
+	s.suffix_index()
+
+	linear = run(extract_linear, number) / (number * len(URLS))
+	indexed = run(s.extract, number) / (number * len(URLS))
+
+	print("index build:    %10.1f us (once per process)" % (build * 1e6))
+	print("linear extract: %10.1f us/call" % (linear * 1e6))
+	print("index extract:  %10.1f us/call" % (indexed * 1e6))
+	print("speedup:        %10.0fx" % (linear / indexed))
+	print("")
+
+	for url in URLS:
+		print(url, extract_linear(url), s.extract(url))
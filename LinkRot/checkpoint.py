@@ -0,0 +1,126 @@
+# On-disk crawl state, so an interrupted crawl can be resumed
+import sqlite3
+import threading
+import time
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+	url TEXT PRIMARY KEY,
+	status TEXT,
+	seq INTEGER,
+	checked_at REAL
+);
+CREATE TABLE IF NOT EXISTS referrers (
+	url TEXT,
+	referrer TEXT,
+	PRIMARY KEY (url, referrer)
+);
+"""
+
+
+def decode_status(status):
+	# status codes are stored as text next to exception names
+	return int(status) if status.isdigit() else status
+
+
+class BatchedStore(object):
+	"""SQLite file shared by the crawler threads.
+
+	Writes are committed in batches of batch_size or every interval seconds,
+	whichever comes first.
+	"""
+
+	schema = ""
+
+	def __init__(self, path, batch_size=500, interval=5.0):
+		self.conn = sqlite3.connect(path, check_same_thread=False)
+		self.conn.execute("PRAGMA journal_mode=WAL")
+		self.conn.execute("PRAGMA synchronous=NORMAL")
+		self.conn.executescript(self.schema)
+
+		self.lock = threading.Lock()
+		self.batch_size = batch_size
+		self.interval = interval
+		self.pending = 0
+		self.last_commit = time.time()
+
+	def _written(self):
+		self.pending += 1
+		if self.pending >= self.batch_size or time.time() - self.last_commit >= self.interval:
+			self.conn.commit()
+			self.pending = 0
+			self.last_commit = time.time()
+
+	def close(self):
+		with self.lock:
+			self.conn.commit()
+			self.conn.close()
+
+
+class CheckpointStore(BatchedStore):
+	"""Frontier, visited set and results of one crawl."""
+
+	schema = SCHEMA
+
+	def __init__(self, path, batch_size=500, interval=5.0):
+		BatchedStore.__init__(self, path, batch_size, interval)
+
+		# stores written before checked_at was recorded
+		columns = [row[1] for row in self.conn.execute("PRAGMA table_info(urls)")]
+		if "checked_at" not in columns:
+			self.conn.execute("ALTER TABLE urls ADD COLUMN checked_at REAL")
+			self.conn.commit()
+
+	def reset(self):
+		with self.lock:
+			self.conn.execute("DELETE FROM urls")
+			self.conn.execute("DELETE FROM referrers")
+			self.conn.commit()
+
+	def add_url(self, url):
+		with self.lock:
+			self.conn.execute("INSERT OR IGNORE INTO urls (url) VALUES (?)", (url,))
+			self._written()
+
+	def add_referrer(self, url, referrer):
+		with self.lock:
+			self.conn.execute("INSERT OR IGNORE INTO referrers VALUES (?, ?)", (url, referrer))
+			self._written()
+
+	def set_result(self, url, status, seq):
+		with self.lock:
+			self.conn.execute("UPDATE urls SET status = ?, seq = ?, checked_at = ? WHERE url = ?",
+							  (str(status), seq, time.time(), url))
+			self._written()
+
+	def frontier(self):
+		rows = self.conn.execute("SELECT url FROM urls WHERE seq IS NULL ORDER BY rowid")
+		return [row[0] for row in rows]
+
+	def visited(self):
+		return set(row[0] for row in self.conn.execute("SELECT url FROM urls"))
+
+	def results(self):
+		# (seq, url, status) of every checked url, in the order they were checked
+		rows = self.conn.execute("SELECT seq, url, status FROM urls WHERE seq IS NOT NULL ORDER BY seq")
+		return [(seq, url, decode_status(status)) for seq, url, status in rows]
+
+	def last_seq(self):
+		return self.conn.execute("SELECT MAX(seq) FROM urls").fetchone()[0] or 0
+
+	def due(self):
+		# (url, status) of every checked url, broken ones first, then the
+		# ones checked longest ago
+		rows = self.conn.execute("""
+			SELECT url, status FROM urls WHERE seq IS NOT NULL
+			ORDER BY CASE WHEN status GLOB '[0-9]*' AND CAST(status AS INTEGER) < 400 THEN 1 ELSE 0 END,
+					 checked_at IS NOT NULL, checked_at
+		""")
+		return [(url, decode_status(status)) for url, status in rows]
+
+	def referrers(self):
+		index = {}
+		for url, referrer in self.conn.execute("SELECT url, referrer FROM referrers"):
+			index.setdefault(url, set()).add(referrer)
+		return index
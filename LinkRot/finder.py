@@ -1,74 +1,436 @@
+# This python script finds and generates a file
+import argparse
+import sys
+import threading
+import time
+from urllib.parse import urljoin
+
 import requests
-from bs4 import BeautifulSoup
+import checkpoint as c
+import httpcache as h
+import linkextract as le
+import metrics as m
+import pool as p
 import sldextract as s
-import sys
 import normalizer as n
 
 
-broken_links = []
-checked_links = []
-count = 0
+headers_checked_file = "Sr_No." + "," + "url" + "," + "status_code" + "," + "Proper" + "\n"
+headers_broken_file = "url" + "," + "status_code" + "," + "referrer" + "\n"
+
+# status codes servers answer HEAD with when they only support GET
+HEAD_REJECTED = (400, 403, 405, 501)
+CHUNK_SIZE = 64 * 1024
+# seconds to wait for a connection, and then between bytes of the response
+TIMEOUT = 30.0
 
-checked_file = open("checked_urls.csv", "w")
-broken_file = open("broken_urls.csv", "w")
 
-headers_checked_file = "Sr_No." + "," + "url" + "," + "status_code" + "," + "Proper" + "\n"
-headers_broken_file = "url" + "," + "status_code" + "\n"
+def error_kind(status_code):
+	# "404" -> "4xx"; failed requests are counted by exception name
+	if isinstance(status_code, int):
+		return str(status_code // 100) + "xx"
+	return status_code
 
-checked_file.write(headers_checked_file)
-broken_file.write(headers_broken_file)
 
-main_url = ""
+class Crawler(object):
+	"""Crawl a site with a pool of worker threads fed from a frontier queue.
 
+	The frontier is a pool.Scheduler, which limits how hard any one host is
+	hit, and every request goes through one shared keep-alive session.
+	"""
 
-def read_url(url):
+	def __init__(self, main_url, checked_file, broken_file, workers=8, status_cache=None,
+				 max_body=5 * 1024 * 1024, include_src=False, store=None,
+				 http_cache=None, session=None, frontier=None, metrics=None, timeout=TIMEOUT):
+		self.main_url = main_url
+		self.main_url_domain = s.extract(main_url)['url_domain']
 
-	global count
+		self.checked_file = checked_file
+		self.broken_file = broken_file
+		self.workers = workers
+		self.max_body = max_body
+		self.include_src = include_src
+		self.store = store
+		self.http_cache = http_cache
+		self.metrics = metrics
+		self.timeout = timeout
 
-	url = n.normalize(url, main_url_domain, main_url_ext)
+		self.session = session if session is not None else p.make_session(workers)
+		self.frontier = frontier if frontier is not None else p.Scheduler()
+		self.lock = threading.Lock()
 
-	#check normalizer.py mailto: condition
-	if url is not None:
-		url_request = requests.get(url)
+		self.broken_links = []
+		self.checked_links = set()
+		self.count = 0
 
-		count += 1
-		print(count)
-		url_domain = s.extract(url)["url_domain"]
+		# canonical url -> status code, reused instead of probing a link twice
+		self.status_cache = status_cache if status_cache is not None else {}
+		# canonical url -> pages linking to it
+		self.referrers = {}
 
-		is_ok = True
+	def enqueue(self, url, base_url=None):
+		url = n.canonicalize(url, base_url)
 
-		if url_request.status_code >= 400:
+		#canonicalize() drops mailto: and other non-http links
+		if url is None:
+			return
 
-			broken_links.append(url)
-			is_ok = False
+		self.claim(url, base_url)
 
-			write_broken = url + "," + str(url_request.status_code) + "\n"
-			broken_file.write(write_broken)
+	def claim(self, url, base_url=None):
+		# links are claimed when queued, so two workers never fetch the same url;
+		# returns False for a url that was already seen
+		with self.lock:
+			if base_url is not None:
+				self.referrers.setdefault(url, set()).add(base_url)
+				if self.store is not None:
+					self.store.add_referrer(url, base_url)
+			if url in self.checked_links:
+				return False
+			self.checked_links.add(url)
+			if self.store is not None:
+				self.store.add_url(url)
 
-		print(url_request.status_code)
-		soup = BeautifulSoup(url_request.content, "html.parser", from_encoding="iso-8859-1")
+		self.frontier.put(url)
+		return True
 
-		url_list = soup.find_all('a', href=True)
-		checked_links.append(url)
+	def request(self, method, url, **kwargs):
+		# sends a request and times it up to the response headers; a host that
+		# never answers fails with a Timeout instead of holding a worker forever
+		p.take_connect_time()
+		start = time.time()
+		url_request = self.session.request(method, url, timeout=self.timeout, **kwargs)
 
-		write_checked = str(count) + "," + url + "," + str(url_request.status_code) + "," + str(is_ok) + "\n"
-		checked_file.write(write_checked)
+		if self.metrics is not None:
+			connect = p.take_connect_time()
+			if connect:
+				self.metrics.observe("connect", connect)
+			self.metrics.observe("ttfb", time.time() - start - connect)
 
-		if url_domain == main_url_domain:
+		return url_request
 
-			for link in url_list:
+	def observe_request(self, url, start):
+		if self.metrics is not None:
+			self.metrics.observe_request(p.host_key(url), time.time() - start)
 
-				if link['href'] not in checked_links:
-					print(link['href'])
-					read_url(link['href'])
+	def probe(self, url):
+		# status only: HEAD, or the first byte of a GET if HEAD is refused
+		start = time.time()
+		try:
+			url_request = self.request("HEAD", url, allow_redirects=True)
+			if url_request.status_code in HEAD_REJECTED:
+				url_request = self.request("GET", url, headers={"Range": "bytes=0-0"}, stream=True)
+				url_request.close()
+		except requests.RequestException as e:
+			return type(e).__name__
 
+		self.observe_request(url, start)
+		return url_request.status_code
 
-if __name__ == '__main__':
+	def fetch(self, url):
+		# status, absolute outlinks and whether the page is unchanged since the
+		# validator cache saw it; the links only for html pages, read up to max_body
+		cached = None
+		headers = {}
+		if self.http_cache is not None:
+			cached = self.http_cache.lookup(url)
+		if cached is not None:
+			etag, last_modified, cached_links, cached_status = cached
+			if etag:
+				headers["If-None-Match"] = etag
+			if last_modified:
+				headers["If-Modified-Since"] = last_modified
+
+		start = time.time()
+		try:
+			url_request = self.request("GET", url, headers=headers, stream=True)
+		except requests.RequestException as e:
+			return type(e).__name__, None, False
+
+		# unchanged since the last run, so the status and links found then still
+		# hold; the page is recorded with that status rather than 304
+		if url_request.status_code == 304 and cached is not None:
+			url_request.close()
+			self.observe_request(url, start)
+			# stored resolved; resolving again only matters for entries written
+			# before links were stored that way
+			return cached_status, [urljoin(url_request.url, link) for link in cached_links], True
+
+		content_type = url_request.headers.get("Content-Type", "")
+		if url_request.status_code >= 400 or not content_type.startswith("text/html"):
+			url_request.close()
+			self.observe_request(url, start)
+			return url_request.status_code, None, False
+
+		# links are pulled out chunk by chunk as the body arrives
+		extractor = None
+		size = 0
+		download_time = parse_time = 0.0
+		mark = time.time()
+		try:
+			for chunk in url_request.iter_content(CHUNK_SIZE):
+				now = time.time()
+				download_time += now - mark
+
+				chunk = chunk[:self.max_body - size]
+				size += len(chunk)
+
+				if extractor is None:
+					encoding = le.detect_encoding(content_type, chunk)
+					extractor = le.LinkExtractor(encoding, self.include_src)
+				extractor.feed_bytes(chunk)
+
+				mark = time.time()
+				parse_time += mark - now
+
+				if size >= self.max_body:
+					break
+		except requests.RequestException as e:
+			return type(e).__name__, None, False
+		finally:
+			url_request.close()
+
+		links = extractor.close() if extractor is not None else []
+		# relative links are resolved against the url the page was served from
+		# after redirects (/docs -> /docs/), not the one that was requested
+		links = [urljoin(url_request.url, link) for link in links]
+
+		if self.metrics is not None:
+			self.metrics.observe("download", download_time)
+			self.metrics.observe("parse", parse_time + time.time() - mark)
+		self.observe_request(url, start)
+
+		if self.http_cache is not None:
+			self.http_cache.store(url, url_request.headers.get("ETag"),
+								  url_request.headers.get("Last-Modified"), links, url_request.status_code)
+
+		return url_request.status_code, links, False
+
+	def write_checked(self, url, status_code):
+		is_ok = isinstance(status_code, int) and status_code < 400
+
+		if not is_ok:
+			self.broken_links.append(url)
+
+		write_checked = str(self.count) + "," + url + "," + str(status_code) + "," + str(is_ok) + "\n"
+		self.checked_file.write(write_checked)
+		return is_ok
+
+	def record(self, url, status_code):
+		with self.lock:
+			self.count += 1
+			print(self.count)
+			print(status_code)
+
+			is_ok = self.write_checked(url, status_code)
+			if not is_ok and self.metrics is not None:
+				self.metrics.count_error(error_kind(status_code))
+			if self.store is not None:
+				self.store.set_result(url, status_code, self.count)
+
+	def is_internal(self, url):
+		return s.extract(url)["url_domain"] == self.main_url_domain
+
+	def read_url(self, url):
+		internal = self.is_internal(url)
+
+		# off-domain links are never parsed, so a known status is all we need
+		if not internal:
+			if url not in self.status_cache:
+				self.status_cache[url] = self.probe(url)
+			self.record(url, self.status_cache[url])
+			return
+
+		status_code, links, unchanged = self.fetch(url)
+		self.status_cache[url] = status_code
+
+		# outlinks are stored before the page is marked done, so a checkpoint
+		# never holds a checked page whose links were lost
+		if links is not None:
+			self.follow(url, status_code, links, unchanged)
+
+		self.record(url, status_code)
+
+	def follow(self, url, status_code, links, unchanged=False):
+		for link in links:
+			self.enqueue(link, url)
+
+	def worker(self):
+		while True:
+			url = self.frontier.get()
 
-	main_url = sys.argv[1]
-	main_url_domain = s.extract(main_url)['url_domain']
-	main_url_ext = s.extract(main_url)['url_tld']
+			# the frontier has been closed
+			if url is None:
+				break
+
+			try:
+				self.read_url(url)
+			except Exception as e:
+				sys.stderr.write("error while reading " + url + ": " + repr(e) + "\n")
+			finally:
+				self.finished(url)
+
+	def finished(self, url):
+		self.frontier.task_done(url)
+
+	def restore(self):
+		# reload a checkpoint: results are replayed into checked_file and the
+		# unchecked urls go back on the frontier
+		self.checked_links = self.store.visited()
+		self.referrers = self.store.referrers()
+
+		for count, url, status_code in self.store.results():
+			self.count = count
+			self.status_cache[url] = status_code
+			self.write_checked(url, status_code)
+
+		for url in self.store.frontier():
+			self.frontier.put(url)
+
+	def start_workers(self):
+		# metrics are written for as long as the workers run, whatever drives them
+		if self.metrics is not None:
+			self.metrics.watch(self.frontier)
+
+		threads = [threading.Thread(target=self.worker) for i in range(self.workers)]
+		for thread in threads:
+			thread.daemon = True
+			thread.start()
+		return threads
+
+	def stop_workers(self, threads):
+		self.frontier.close()
+		for thread in threads:
+			thread.join()
+
+		if self.metrics is not None:
+			self.metrics.stop()
+
+	def crawl(self, resume=False):
+		threads = self.start_workers()
+
+		if resume and self.store is not None:
+			self.restore()
+		if not self.checked_links:
+			self.enqueue(self.main_url)
+		self.frontier.join()
+
+		self.stop_workers(threads)
+
+		self.report()
+
+	def report(self):
+		# written once the crawl is over, when every referrer is known
+		for url in self.broken_links:
+			status_code = self.status_cache[url]
+
+			for referrer in sorted(self.referrers.get(url, [""])):
+				write_broken = url + "," + str(status_code) + "," + referrer + "\n"
+				self.broken_file.write(write_broken)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Find broken links on a website.")
+	parser.add_argument("url", help="page to start crawling from")
+	parser.add_argument("-w", "--workers", type=int, default=8,
+						help="number of concurrent fetchers across all hosts (default: 8)")
+	parser.add_argument("--max-body", type=int, default=5 * 1024 * 1024,
+						help="bytes of a page to download and parse at most (default: 5 MiB)")
+	parser.add_argument("--src", action="store_true",
+						help="also check src links (images, scripts, frames)")
+	parser.add_argument("--timeout", type=float, default=TIMEOUT,
+						help="seconds to wait for a connection or for the next bytes of a response "
+							 "(default: %g)" % TIMEOUT)
+	parser.add_argument("--state",
+						help="checkpoint file the crawl is saved to (default: crawl_state.sqlite)")
+	parser.add_argument("--resume", action="store_true",
+						help="continue the crawl saved in --state instead of starting over")
+	parser.add_argument("--http-cache",
+						help="file keeping ETag/Last-Modified and links of pages between runs "
+							 "(default: http_cache.sqlite)")
+	parser.add_argument("--no-http-cache", action="store_true",
+						help="always download pages in full")
+	parser.add_argument("--per-host", type=int,
+						help="requests in flight to one host at most, 0 for no limit (default: --workers)")
+	parser.add_argument("--rate", type=float, default=0,
+						help="requests per second to one host at most (default: no limit)")
+	parser.add_argument("--metrics",
+						help="file to write crawl metrics to every --metrics-interval seconds, "
+							 "as Prometheus text if it ends in .prom, else as JSON")
+	parser.add_argument("--metrics-interval", type=float, default=10.0,
+						help="seconds between metrics writes (default: 10)")
+	parser.add_argument("-p", "--processes", type=int, default=1,
+						help="split the crawl across this many processes, each with --workers "
+							 "fetchers (default: 1)")
+	parser.add_argument("--shard-by", choices=("url", "host"), default="url",
+						help="what a url's process is chosen by when --processes > 1 (default: url)")
+	parser.add_argument("--reverify", action="store_true",
+						help="re-check the urls saved in --state, broken and least recently "
+							 "checked first, instead of crawling the whole site")
+	parser.add_argument("--budget", type=int,
+						help="with --reverify, check at most this many urls")
+	parser.add_argument("--time-budget", type=float,
+						help="with --reverify, start no new checks after this many seconds")
+	args = parser.parse_args(argv)
+
+	if args.processes > 1:
+		# shards keep no checkpoint, validator cache or metrics
+		for option, value in (("--state", args.state), ("--resume", args.resume),
+							  ("--reverify", args.reverify), ("--http-cache", args.http_cache),
+							  ("--metrics", args.metrics)):
+			if value:
+				parser.error(option + " cannot be used with --processes")
+
+		# imported here as shard.py builds on this module
+		import shard
+		shard.crawl_sharded(args.url, args.processes, args.shard_by, args.per_host, args.rate,
+							workers=args.workers, max_body=args.max_body, include_src=args.src,
+							timeout=args.timeout)
+		return
+
+	store = c.CheckpointStore(args.state or "crawl_state.sqlite")
+	if not args.resume and not args.reverify:
+		store.reset()
+
+	http_cache = None
+	if not args.no_http_cache:
+		http_cache = h.ValidatorCache(args.http_cache or "http_cache.sqlite")
+
+	checked_file = open("checked_urls.csv", "w")
+	broken_file = open("broken_urls.csv", "w")
+
+	checked_file.write(headers_checked_file)
+	broken_file.write(headers_broken_file)
+
+	metrics = None
+	if args.metrics:
+		metrics = m.Metrics(args.metrics, args.metrics_interval)
+
+	# by default only the worker count limits the requests to the site
+	per_host = args.per_host if args.per_host is not None else args.workers
+
+	options = dict(workers=args.workers, max_body=args.max_body, include_src=args.src, store=store,
+				   timeout=args.timeout, http_cache=http_cache, frontier=p.Scheduler(per_host, args.rate),
+				   metrics=metrics)
+
+	if args.reverify:
+		# imported here as reverify.py builds on this module
+		import reverify
+		crawler = reverify.Reverifier(args.url, checked_file, broken_file, budget=args.budget,
+									  time_budget=args.time_budget, **options)
+	else:
+		crawler = Crawler(args.url, checked_file, broken_file, **options)
+
+	try:
+		crawler.crawl(resume=args.resume)
+	finally:
+		store.close()
+		if http_cache is not None:
+			http_cache.close()
 
-	read_url(main_url)
 	checked_file.close()
 	broken_file.close()
+
+
+if __name__ == '__main__':
+	main()
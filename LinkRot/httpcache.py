@@ -0,0 +1,50 @@
+# Validators and outlinks of crawled pages, kept between runs for conditional requests
+import checkpoint as c
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS validators (
+	url TEXT PRIMARY KEY,
+	etag TEXT,
+	last_modified TEXT,
+	links TEXT,
+	status INTEGER
+);
+"""
+
+
+class ValidatorCache(c.BatchedStore):
+	"""ETag, Last-Modified, status and extracted links, made absolute, of every html page seen."""
+
+	schema = SCHEMA
+
+	def __init__(self, path, batch_size=500, interval=5.0):
+		c.BatchedStore.__init__(self, path, batch_size, interval)
+
+		# caches written before the status was recorded
+		columns = [row[1] for row in self.conn.execute("PRAGMA table_info(validators)")]
+		if "status" not in columns:
+			self.conn.execute("ALTER TABLE validators ADD COLUMN status INTEGER")
+
+	def lookup(self, url):
+		# (etag, last_modified, links, status), or None for a page not seen before
+		with self.lock:
+			row = self.conn.execute("SELECT etag, last_modified, links, status FROM validators WHERE url = ?",
+									(url,)).fetchone()
+
+		if row is None:
+			return None
+
+		etag, last_modified, links, status = row
+		# only pages fetched successfully are stored, so older rows were a 200
+		return etag, last_modified, links.split("\n") if links else [], status or 200
+
+	def store(self, url, etag, last_modified, links, status=200):
+		# pages without validators can never be answered with a 304
+		if not etag and not last_modified:
+			return
+
+		with self.lock:
+			self.conn.execute("INSERT OR REPLACE INTO validators VALUES (?, ?, ?, ?, ?)",
+							  (url, etag, last_modified, "\n".join(links), status))
+			self._written()
@@ -0,0 +1,58 @@
+# Pulls link targets out of html without building a document tree
+import codecs
+import re
+from html.parser import HTMLParser
+
+
+CHARSET_RE = re.compile(br'<meta[^>]+charset=["\']?([A-Za-z0-9_:.-]+)', re.I)
+SNIFF_BYTES = 1024
+
+
+def detect_encoding(content_type="", head=b""):
+	# the Content-Type header wins, then a <meta> charset near the top of the page
+	for param in content_type.split(";")[1:]:
+		name, _, value = param.strip().partition("=")
+		if name.lower() == "charset":
+			encoding = value.strip('"\' ')
+			break
+	else:
+		match = CHARSET_RE.search(head[:SNIFF_BYTES])
+		encoding = match.group(1).decode("ascii") if match else "utf-8"
+
+	try:
+		return codecs.lookup(encoding).name
+	except LookupError:
+		return "utf-8"
+
+
+class LinkExtractor(HTMLParser):
+	"""Collect the href of every <a> (and optionally every src) as the page is fed in."""
+
+	def __init__(self, encoding="utf-8", include_src=False):
+		HTMLParser.__init__(self, convert_charrefs=True)
+		self.decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+		self.include_src = include_src
+		self.links = []
+
+	def handle_starttag(self, tag, attrs):
+		for name, value in attrs:
+			if value is None:
+				continue
+			if name == "href" and tag == "a":
+				self.links.append(value)
+			elif name == "src" and self.include_src:
+				self.links.append(value)
+
+	def feed_bytes(self, chunk):
+		self.feed(self.decoder.decode(chunk))
+
+	def close(self):
+		self.feed(self.decoder.decode(b"", final=True))
+		HTMLParser.close(self)
+		return self.links
+
+
+def extract_links(content, content_type="", include_src=False):
+	extractor = LinkExtractor(detect_encoding(content_type, content), include_src)
+	extractor.feed_bytes(content)
+	return extractor.close()
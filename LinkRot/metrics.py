@@ -0,0 +1,161 @@
+# Crawl metrics, written to a JSON or Prometheus text file while the crawl runs
+import json
+import os
+import threading
+import time
+
+
+# upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PHASES = ("connect", "ttfb", "download", "parse")
+
+
+class Histogram(object):
+
+	def __init__(self):
+		self.counts = [0] * (len(BUCKETS) + 1)
+		self.sum = 0.0
+		self.count = 0
+
+	def observe(self, seconds):
+		for i, bound in enumerate(BUCKETS):
+			if seconds <= bound:
+				break
+		else:
+			i = len(BUCKETS)
+
+		self.counts[i] += 1
+		self.sum += seconds
+		self.count += 1
+
+	def cumulative(self):
+		# (le, count) pairs, as Prometheus buckets count every lower bucket too
+		total = 0
+		pairs = []
+		for bound, count in zip(BUCKETS + ("+Inf",), self.counts):
+			total += count
+			pairs.append((bound, total))
+		return pairs
+
+	def as_dict(self):
+		return {
+			"count": self.count,
+			"sum": round(self.sum, 6),
+			"buckets": [[str(bound), count] for bound, count in self.cumulative()],
+		}
+
+
+class Metrics(object):
+	"""Phase timings, per-host latency, error counts and frontier depth of a crawl.
+
+	Requests are timed in four phases: connect (only when a new connection
+	is opened), ttfb (request sent until headers arrive), download (reading
+	the body) and parse (extracting links from it).
+	"""
+
+	def __init__(self, path=None, interval=10.0):
+		self.path = path
+		self.interval = interval
+		self.lock = threading.Lock()
+		self.start = time.time()
+
+		self.phases = dict((phase, Histogram()) for phase in PHASES)
+		self.hosts = {}
+		self.errors = {}
+		self.requests = 0
+		self.queue_depth = []
+
+		self.frontier = None
+		self.stopped = threading.Event()
+		self.thread = None
+
+	def observe(self, phase, seconds):
+		with self.lock:
+			self.phases[phase].observe(seconds)
+
+	def observe_request(self, host, seconds):
+		# total time of one request to host, from sending it to the last byte read
+		with self.lock:
+			self.requests += 1
+			if host not in self.hosts:
+				self.hosts[host] = Histogram()
+			self.hosts[host].observe(seconds)
+
+	def count_error(self, kind):
+		with self.lock:
+			self.errors[kind] = self.errors.get(kind, 0) + 1
+
+	def sample_queue(self):
+		if self.frontier is not None:
+			depth = self.frontier.qsize()
+			with self.lock:
+				self.queue_depth.append([round(time.time() - self.start, 3), depth])
+
+	def snapshot(self):
+		with self.lock:
+			return {
+				"elapsed": round(time.time() - self.start, 3),
+				"requests": self.requests,
+				"phases": dict((phase, h.as_dict()) for phase, h in self.phases.items()),
+				"hosts": dict((host, h.as_dict()) for host, h in self.hosts.items()),
+				"errors": dict(self.errors),
+				"queue_depth": list(self.queue_depth),
+			}
+
+	def prometheus(self):
+		with self.lock:
+			lines = [
+				"# TYPE linkrot_requests_total counter",
+				"linkrot_requests_total %d" % self.requests,
+				"# TYPE linkrot_queue_depth gauge",
+				"linkrot_queue_depth %d" % (self.queue_depth[-1][1] if self.queue_depth else 0),
+				"# TYPE linkrot_errors_total counter",
+			]
+			for kind, count in sorted(self.errors.items()):
+				lines.append('linkrot_errors_total{kind="%s"} %d' % (kind, count))
+
+			for name, label, histograms in (("linkrot_phase_seconds", "phase", self.phases),
+											("linkrot_host_request_seconds", "host", self.hosts)):
+				lines.append("# TYPE %s histogram" % name)
+				for key, h in sorted(histograms.items()):
+					for bound, count in h.cumulative():
+						lines.append('%s_bucket{%s="%s",le="%s"} %d' % (name, label, key, bound, count))
+					lines.append('%s_sum{%s="%s"} %f' % (name, label, key, h.sum))
+					lines.append('%s_count{%s="%s"} %d' % (name, label, key, h.count))
+
+		return "\n".join(lines) + "\n"
+
+	def write(self):
+		if self.path is None:
+			return
+
+		if self.path.endswith(".prom"):
+			text = self.prometheus()
+		else:
+			text = json.dumps(self.snapshot(), indent=1)
+
+		# written aside and renamed, so readers never see half a file
+		tmp_path = self.path + ".tmp"
+		with open(tmp_path, "w") as out:
+			out.write(text)
+		os.replace(tmp_path, self.path)
+
+	def run(self):
+		while not self.stopped.wait(self.interval):
+			self.sample_queue()
+			self.write()
+
+	def watch(self, frontier):
+		# sample frontier and rewrite the metrics file every interval seconds
+		self.frontier = frontier
+		self.sample_queue()
+		self.thread = threading.Thread(target=self.run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def stop(self):
+		self.stopped.set()
+		if self.thread is not None:
+			self.thread.join()
+		self.sample_queue()
+		self.write()
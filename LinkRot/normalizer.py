@@ -1,15 +1,34 @@
-def normalize(url, main_url_domain, extension):
-	if url[0] == "#":
+from urllib.parse import urljoin, urlsplit, urlunsplit
 
-		url = "https://" + main_url_domain + extension + "/" + url
 
-	elif url.startswith('//'):
-		url = "https:" + url
+DEFAULT_PORTS = {"http": 80, "https": 443}
 
-	elif url.startswith('/'):
-		url = "https://" + main_url_domain + extension + url
 
-	elif url.startswith("mailto:"):
-		url = None
+def canonicalize(url, base_url=None):
+	# resolve url against the page it was found on and return the key used
+	# to tell whether two links point at the same resource
+	url = url.strip()
 
-	return url
+	if base_url is not None:
+		url = urljoin(base_url, url)
+
+	parts = urlsplit(url)
+	scheme = parts.scheme.lower()
+
+	#mailto:, javascript:, tel: and friends are not crawlable
+	if scheme not in DEFAULT_PORTS or not parts.hostname:
+		return None
+
+	netloc = parts.hostname.lower()
+	try:
+		port = parts.port
+	except ValueError:
+		return None
+	if port is not None and port != DEFAULT_PORTS[scheme]:
+		netloc += ":" + str(port)
+	if parts.username is not None:
+		netloc = parts.username + ("@" if parts.password is None else ":" + parts.password + "@") + netloc
+
+	path = parts.path or "/"
+
+	return urlunsplit((scheme, netloc, path, parts.query, ""))
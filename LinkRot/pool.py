@@ -0,0 +1,193 @@
+# Shared keep-alive session and a per-host politeness scheduler for the crawler
+import collections
+import heapq
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+# time the last connection opened by this thread took to set up (tcp + tls)
+_connect = threading.local()
+
+
+def take_connect_time():
+	# 0 when the last request reused a kept-alive connection
+	seconds = getattr(_connect, "seconds", 0.0)
+	_connect.seconds = 0.0
+	return seconds
+
+
+class TimedHTTPConnection(HTTPConnection):
+
+	def connect(self):
+		start = time.time()
+		HTTPConnection.connect(self)
+		_connect.seconds = time.time() - start
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+
+	def connect(self):
+		start = time.time()
+		HTTPSConnection.connect(self)
+		_connect.seconds = time.time() - start
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+	ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+	ConnectionCls = TimedHTTPSConnection
+
+
+def make_session(pool_size=8, hosts=100):
+	# one session for every worker, so connections to a host are reused
+	session = requests.Session()
+	adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=pool_size)
+	adapter.poolmanager.pool_classes_by_scheme = {
+		"http": TimedHTTPConnectionPool,
+		"https": TimedHTTPSConnectionPool,
+	}
+	session.mount("http://", adapter)
+	session.mount("https://", adapter)
+	return session
+
+
+def host_key(url):
+	return urlsplit(url).netloc
+
+
+class Scheduler(object):
+	"""Frontier that hands out urls host by host.
+
+	At most per_host urls of one host are in flight at a time (no limit if
+	None), and each host is limited to rate requests per second (bursts of
+	up to burst requests) by a token bucket. Hosts are served round robin,
+	so a slow or rate limited origin never holds up the others. Used like a
+	queue.Queue: get() a url, then task_done(url) once it has been checked.
+
+	Only hosts that may be fetched from sit in the ready queue, and the ones
+	waiting for a token in a heap ordered by when they get it, so get() does
+	not look at every host with pending urls.
+	"""
+
+	def __init__(self, per_host=None, rate=None, burst=1):
+		self.per_host = per_host
+		self.rate = rate
+		self.burst = burst
+
+		self.cond = threading.Condition()
+		self.pending = {}
+		self.size = 0
+		self.ready = collections.deque()
+		self.waiting = []
+		# hosts in ready or waiting, so neither holds a host twice
+		self.scheduled = set()
+		self.active = collections.Counter()
+		self.buckets = {}
+		self.unfinished = 0
+		self.closed = False
+
+	def put(self, url):
+		host = host_key(url)
+
+		with self.cond:
+			self.pending.setdefault(host, collections.deque()).append(url)
+			self.size += 1
+			self.unfinished += 1
+			self._schedule(host)
+			self.cond.notify()
+
+	def qsize(self):
+		with self.cond:
+			return self.size
+
+	def _schedule(self, host):
+		# queue host if it has urls and room for another request
+		if host in self.scheduled or host not in self.pending:
+			return
+		if self.per_host and self.active[host] >= self.per_host:
+			return
+		self.scheduled.add(host)
+		self.ready.append(host)
+
+	def _delay(self, host, now):
+		# seconds until host has a token; refills the bucket on the way
+		if not self.rate:
+			return 0
+
+		tokens, last = self.buckets.get(host, (self.burst, now))
+		tokens = min(self.burst, tokens + (now - last) * self.rate)
+		self.buckets[host] = (tokens, now)
+
+		if tokens >= 1:
+			return 0
+		return (1 - tokens) / self.rate
+
+	def _take(self, host):
+		if self.rate:
+			tokens, last = self.buckets[host]
+			self.buckets[host] = (tokens - 1, last)
+
+		url = self.pending[host].popleft()
+		if not self.pending[host]:
+			del self.pending[host]
+		self.size -= 1
+
+		self.active[host] += 1
+		# back of the queue, behind every other ready host
+		self._schedule(host)
+		return url
+
+	def get(self):
+		# blocks until some host may be fetched from; None once closed
+		with self.cond:
+			while not self.closed:
+				now = time.time()
+
+				while self.waiting and self.waiting[0][0] <= now:
+					host = heapq.heappop(self.waiting)[1]
+					self.scheduled.discard(host)
+					self._schedule(host)
+
+				while self.ready:
+					host = self.ready.popleft()
+
+					delay = self._delay(host, now)
+					if delay > 0:
+						heapq.heappush(self.waiting, (now + delay, host))
+						continue
+
+					self.scheduled.discard(host)
+					return self._take(host)
+
+				self.cond.wait(self.waiting[0][0] - now if self.waiting else None)
+
+			return None
+
+	def task_done(self, url):
+		host = host_key(url)
+
+		with self.cond:
+			self.active[host] -= 1
+			if not self.active[host]:
+				del self.active[host]
+			self._schedule(host)
+			self.unfinished -= 1
+			self.cond.notify_all()
+
+	def join(self):
+		with self.cond:
+			while self.unfinished:
+				self.cond.wait()
+
+	def close(self):
+		with self.cond:
+			self.closed = True
+			self.cond.notify_all()
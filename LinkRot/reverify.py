@@ -0,0 +1,91 @@
+# Re-checks the links of an earlier crawl instead of crawling the whole site again
+import time
+
+import finder as f
+
+
+def is_ok(status_code):
+	return isinstance(status_code, int) and status_code < 400
+
+
+class Reverifier(f.Crawler):
+	"""Re-probe the urls saved in a crawl's checkpoint store.
+
+	Broken urls come first, then the ones checked longest ago. At most budget
+	urls are checked (all of them if None) and nothing new is started once
+	time_budget seconds have passed. Pages answering 304 (unchanged) are not followed;
+	links found on pages that did change are checked as well, unless the
+	store already knows them, in which case they wait for their own turn.
+	"""
+
+	def __init__(self, main_url, checked_file, broken_file, budget=None, time_budget=None, **kwargs):
+		f.Crawler.__init__(self, main_url, checked_file, broken_file, **kwargs)
+		self.budget = budget
+		self.time_budget = time_budget
+		self.deadline = None
+		self.claimed = 0
+		self.previous = {}
+
+	def claim(self, url, base_url=None):
+		with self.lock:
+			over_budget = self.budget is not None and self.claimed >= self.budget
+			if not over_budget and url not in self.checked_links:
+				self.claimed += 1
+
+		if over_budget:
+			return False
+		return f.Crawler.claim(self, url, base_url)
+
+	def read_url(self, url):
+		if self.deadline is not None and time.time() > self.deadline:
+			return
+		f.Crawler.read_url(self, url)
+
+	def follow(self, url, status_code, links, unchanged=False):
+		# an unchanged page links to what it linked to last time
+		if unchanged:
+			return
+		f.Crawler.follow(self, url, status_code, links, unchanged)
+
+	def crawl(self, resume=False):
+		due = self.store.due()
+		if self.budget is not None:
+			due = due[:self.budget]
+
+		self.previous = dict(due)
+		self.referrers = self.store.referrers()
+		self.checked_links = self.store.visited()
+		self.count = self.store.last_seq()
+		self.claimed = len(due)
+
+		if self.time_budget is not None:
+			self.deadline = time.time() + self.time_budget
+
+		threads = self.start_workers()
+		for url, status_code in due:
+			self.frontier.put(url)
+		self.frontier.join()
+		self.stop_workers(threads)
+
+		self.report()
+		self.summary()
+
+	def summary(self):
+		fixed = still_broken = newly_broken = 0
+
+		for url, status_code in self.previous.items():
+			if url not in self.status_cache:
+				continue
+			if is_ok(status_code) and not is_ok(self.status_cache[url]):
+				newly_broken += 1
+			elif not is_ok(status_code):
+				if is_ok(self.status_cache[url]):
+					fixed += 1
+				else:
+					still_broken += 1
+
+		checked = len([url for url in self.previous if url in self.status_cache])
+		print("re-checked " + str(checked) + " of " + str(len(self.previous)) + " urls, " +
+			  str(len(self.status_cache) - checked) + " new")
+		print("fixed: " + str(fixed) + ", still broken: " + str(still_broken) +
+			  ", newly broken: " + str(newly_broken))
@@ -0,0 +1,176 @@
+# Splits a crawl across processes, each one owning the urls (or hosts) that hash to it
+import multiprocessing
+import os
+import threading
+import zlib
+
+import finder as f
+import normalizer as n
+import pool as p
+
+
+def shard_of(url, shards, shard_by="url"):
+	# crc32 rather than hash(), which differs between interpreters
+	key = p.host_key(url) if shard_by == "host" else url
+	return zlib.crc32(key.encode("utf-8")) % shards
+
+
+def shard_path(path, shard):
+	root, ext = os.path.splitext(path)
+	return root + ".shard" + str(shard) + ext
+
+
+class ShardCrawler(f.Crawler):
+	"""Crawler for the urls of one shard.
+
+	Links owned by another shard are sent to that shard's inbox, so each url
+	is only ever claimed by one process and the visited sets never overlap.
+	outstanding counts the urls sent or queued but not yet checked across
+	all processes; done is set when it drops to zero.
+	"""
+
+	def __init__(self, shard, inboxes, outstanding, done, shard_by, *args, **kwargs):
+		f.Crawler.__init__(self, *args, **kwargs)
+		self.shard = shard
+		self.inboxes = inboxes
+		self.outstanding = outstanding
+		self.done = done
+		self.shard_by = shard_by
+
+	def add_outstanding(self, delta):
+		with self.outstanding.get_lock():
+			self.outstanding.value += delta
+			if self.outstanding.value == 0:
+				self.done.set()
+
+	def enqueue(self, url, base_url=None):
+		url = n.canonicalize(url, base_url)
+
+		#canonicalize() drops mailto: and other non-http links
+		if url is None:
+			return
+
+		self.add_outstanding(1)
+
+		owner = shard_of(url, len(self.inboxes), self.shard_by)
+		if owner == self.shard:
+			self.claim_local(url, base_url)
+		else:
+			self.inboxes[owner].put((url, base_url))
+
+	def claim_local(self, url, base_url):
+		if not self.claim(url, base_url):
+			self.add_outstanding(-1)
+
+	def finished(self, url):
+		f.Crawler.finished(self, url)
+		self.add_outstanding(-1)
+
+	def receive(self):
+		while True:
+			message = self.inboxes[self.shard].get()
+			if message is None:
+				break
+			self.claim_local(*message)
+
+	def crawl(self, resume=False):
+		threads = self.start_workers()
+
+		receiver = threading.Thread(target=self.receive)
+		receiver.daemon = True
+		receiver.start()
+
+		self.done.wait()
+
+		self.stop_workers(threads)
+		receiver.join()
+		self.report()
+
+
+def run_shard(shard, inboxes, outstanding, done, shard_by, main_url, per_host, rate, options):
+	checked_file = open(shard_path("checked_urls.csv", shard), "w")
+	broken_file = open(shard_path("broken_urls.csv", shard), "w")
+
+	crawler = ShardCrawler(shard, inboxes, outstanding, done, shard_by, main_url,
+						   checked_file, broken_file, frontier=p.Scheduler(per_host, rate), **options)
+	crawler.crawl()
+
+	checked_file.close()
+	broken_file.close()
+
+
+def merge(shards):
+	# shard results are concatenated under one header, renumbering Sr_No.
+	checked_file = open("checked_urls.csv", "w")
+	broken_file = open("broken_urls.csv", "w")
+
+	checked_file.write(f.headers_checked_file)
+	broken_file.write(f.headers_broken_file)
+
+	count = 0
+	for shard in range(shards):
+		with open(shard_path("checked_urls.csv", shard)) as shard_file:
+			for line in shard_file:
+				count += 1
+				checked_file.write(str(count) + "," + line.split(",", 1)[1])
+		os.remove(shard_path("checked_urls.csv", shard))
+
+		with open(shard_path("broken_urls.csv", shard)) as shard_file:
+			broken_file.write(shard_file.read())
+		os.remove(shard_path("broken_urls.csv", shard))
+
+	checked_file.close()
+	broken_file.close()
+
+
+def crawl_sharded(main_url, processes, shard_by="url", per_host=None, rate=0, **options):
+	"""Crawl main_url with processes worker processes and merge their CSV files.
+
+	With shard_by "url" the pages of one host are spread over every process,
+	so per_host and rate are split between them to keep the same limits
+	overall. options are passed on to each process's Crawler (workers,
+	max_body, ...). Raises RuntimeError if a process dies.
+	"""
+	if shard_by == "url":
+		if per_host:
+			per_host = max(1, per_host // processes)
+		if rate:
+			rate = float(rate) / processes
+
+	inboxes = [multiprocessing.Queue() for i in range(processes)]
+	outstanding = multiprocessing.Value("l", 0)
+	done = multiprocessing.Event()
+
+	workers = [multiprocessing.Process(target=run_shard,
+									   args=(shard, inboxes, outstanding, done, shard_by, main_url,
+											 per_host, rate, options))
+			   for shard in range(processes)]
+	for worker in workers:
+		worker.start()
+
+	url = n.canonicalize(main_url)
+	with outstanding.get_lock():
+		outstanding.value += 1
+	inboxes[shard_of(url, processes, shard_by)].put((url, None))
+
+	# a shard that dies would never bring outstanding down to zero
+	while not done.wait(1.0):
+		dead = [shard for shard, worker in enumerate(workers) if not worker.is_alive()]
+		if dead:
+			for worker in workers:
+				worker.terminate()
+				worker.join()
+			raise RuntimeError("shard " + str(dead[0]) + " exited with code " +
+							   str(workers[dead[0]].exitcode))
+
+	for inbox in inboxes:
+		inbox.put(None)
+	for worker in workers:
+		worker.join()
+
+	failed = [shard for shard, worker in enumerate(workers) if worker.exitcode != 0]
+	if failed:
+		raise RuntimeError("shard " + str(failed[0]) + " exited with code " +
+						   str(workers[failed[0]].exitcode))
+
+	merge(processes)
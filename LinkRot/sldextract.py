@@ -1,25 +1,69 @@
-def extract(url):
-	#file with tld extensions
-	f = open("tld.txt", 'r')
+import os
+import threading
+
+#file with tld extensions
+TLD_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tld.txt")
+
+_suffixes = None
+_suffixes_lock = threading.Lock()
+
+
+def load_suffixes(path=TLD_FILE):
+	f = open(path, 'r')
+	suffixes = set()
+
+	for line in f:
+		suffix = line.strip().rstrip(',')
+		if suffix:
+			suffixes.add(suffix.lower())
+
+	f.close()
+	return frozenset(suffixes)
+
+
+def suffix_index():
+	# built on first use and shared by every caller in the process
+	global _suffixes
 
-	tld_list = (f.read()).split(",\n  ")
+	if _suffixes is None:
+		with _suffixes_lock:
+			if _suffixes is None:
+				_suffixes = load_suffixes()
 
-	url = url.replace("https://", "")
-	if '/' in url:
-		url = url[:url.index('/')]
+	return _suffixes
 
-	for i in tld_list:
-		if url.endswith(i):
-			url_tld = i
 
-			url = url.replace(url_tld, "")
-			# print(i)
-			break
+def split_host(host):
+	suffixes = suffix_index()
+	labels = host.split('.')
 
-	else:
-		url_tld = ""
+	# longest candidate first, so ".co.uk" wins over ".uk"
+	for i in range(1, len(labels)):
+		candidate = "." + ".".join(labels[i:])
+		if candidate in suffixes:
+			return ".".join(labels[:i]), candidate
 
-	url_domain = url.strip('.')
+	return host, ""
+
+
+def host_of(url):
+	if "://" in url:
+		url = url[url.index("://") + 3:]
+
+	for sep in '/?#':
+		if sep in url:
+			url = url[:url.index(sep)]
+
+	# drop credentials and port
+	url = url.rpartition('@')[2]
+	if ':' in url:
+		url = url[:url.index(':')]
+
+	return url.lower().strip('.')
+
+
+def extract(url):
+	url_domain, url_tld = split_host(host_of(url))
 
-	url_contents = {"url_domain": url_domain, "url_tld": url_tld}
+	url_contents = {"url_domain": url_domain.strip('.'), "url_tld": url_tld}
 	return url_contents